@@ -4,41 +4,71 @@ from solid.utils import *
 import os
 import math
 from typing import Union, List, Tuple, Callable
+from .render import scad_render_split, scad_render_cached, write_if_changed, _split
+from .serialize import save, load
+from .aio import adump, acompile
+from .sweep import hull_chain, sweep, Module
+from .interning import (
+    set_immutable,
+    is_immutable,
+    structural_hash,
+    interned,
+    thaw,
+)
+from .config import Config, get_config, set_config, configure
+from . import objects
 
 __version__ = "0.1.0"
 
 def subseteq(x, y):
     return (xset := set(x)) in y and list(xset) == list(x)
 
+def _segments(segments):
+    return get_config().segments if segments is None else segments
+
 def ff_translate(self, x, y, z=0):
-    return solid.translate([x, y, z])(self)
+    return objects.translate([x, y, z])(self)
 
 def ff_rotate(self, x, y=None, z=None, v=None):
     if y == None and z == None:
-        return solid.rotate(x)(self)
+        return objects.rotate(x)(self)
     if v is None:
-        return solid.rotate((x, y, z))(self)
-    return solid.rotate(a=[x, y, z], v=v)(self)
+        return objects.rotate((x, y, z))(self)
+    return objects.rotate(a=[x, y, z], v=v)(self)
 
-def dump(root, fn, prefix=""):
-    if fn.endswith(".py"):
-        fn = fn.replace(".py", "")
+def _render_scad(root, fn, prefix, split, min_nodes):
     if hasattr(root, "__call__"):
         root = root()
-    with open(fn, "wb") as op:
-        op.write(prefix.encode("utf-8"))
-        op.write(solid.scad_render(root).encode("utf-8"))
+    config = get_config()
+    split = config.split if split is None else split
+    min_nodes = config.min_nodes if min_nodes is None else min_nodes
+    cached = config.immutable if config.cache is None else config.cache
+    if split:
+        code, splitter = _split(root, fn, min_nodes, cached)
+        write_if_changed(fn, prefix + code)
+        # only now nothing refers to the old fragments anymore
+        splitter.prune()
+        return
+    code = scad_render_cached(root) if cached else solid.scad_render(root)
+    write_if_changed(fn, prefix + code)
+
+def dump(root, fn, prefix="", split=None, min_nodes=None):
+    """Write root to fn.
+    With split=True, every subtree of at least min_nodes nodes goes into
+    its own content hashed file that is `use`d - unchanged ones are not rewritten,
+    ones no longer used are removed.
+    split and min_nodes default to the current Config, as does whether
+    rendered text is kept to reuse next time (Config.cache)."""
+    if fn.endswith(".py"):
+        fn = fn.replace(".py", "")
+    _render_scad(root, fn, prefix, split, min_nodes)
 
-def dump_this(root, prefix=""):
+def dump_this(root, prefix="", split=None, min_nodes=None):
     import sys
     file = sys.argv[0]
     if file.endswith(".py"):
         file = file[:-2] + "scad"
-    if hasattr(root, "__call__"):
-        root = root()
-    with open(file, "wb") as op:
-        op.write(prefix.encode("utf-8"))
-        op.write(solid.scad_render(root).encode("utf-8"))
+    _render_scad(root, file, prefix, split, min_nodes)
 
 def _check_axis(axis):
     if not axis in ("x", "y", "z"):
@@ -47,7 +77,7 @@ def _check_axis(axis):
 def ff_linear_extrude(obj, height, axis="z", center=False, **kwargs):
     """Note that center only centers the 'axis', not your 2d object"""
     _check_axis(axis)
-    o = solid.linear_extrude(height, **kwargs)(obj)
+    o = objects.linear_extrude(height, **kwargs)(obj)
     if center:
         o = o.down(height / 2)
     if axis == "y":
@@ -56,54 +86,96 @@ def ff_linear_extrude(obj, height, axis="z", center=False, **kwargs):
         return o.rotate(0, 90, 0)
     return o
 
-def ff_offset(self, r=None, delta=None, chamfer=False, segments=60):
-    return solid.offset(r=r, delta=delta, chamfer=chamfer, segments=segments)(self)
+def ff_offset(self, r=None, delta=None, chamfer=False, segments=None):
+    return objects.offset(r=r, delta=delta, chamfer=chamfer, segments=_segments(segments))(self)
+
+def ff_distance(self, points):
+    """Signed distance of points (N, 3) to self, negative inside - see solidff.sdf"""
+    from .sdf import distance
+    return distance(self, points)
 
-def patches(l: List[Tuple[List[str], Callable]]):
+def ff_contains(self, points, tolerance=0.0):
+    from .sdf import contains
+    return contains(self, points, tolerance)
+
+def _rot(a, v):
+    return lambda self: objects.rotate(a=a, v=v)(self)
+
+def patches(l: List[Tuple[List[str], Callable]], target=solid.OpenSCADObject):
     for names, val in l:
         for s in names:
-            setattr(solid.OpenSCADObject, s, val)
+            setattr(target, s, val)
 
-patches([
-    (["d", "debug"], lambda self: solid.debug(self)),
-    (["b", "background"], lambda self: solid.background(self)),
-    (["h", "hole"], lambda self: solid.hole()(self)),
+# all of these return nodes, interned ones in immutable mode
+_shortcuts = [(names, interned(val)) for names, val in [
+    (["d", "debug"], lambda self: solid.debug(thaw(self))),
+    (["b", "background"], lambda self: solid.background(thaw(self))),
+    (["h", "hole"], lambda self: objects.hole()(self)),
     (["t", "translate"], ff_translate),
     (["r", "rotate"], ff_rotate),
-    (["s", "scale"], lambda self, x=1, y=1, z=1: solid.scale([x, y, z])(self)),
+    (["s", "scale"], lambda self, x=1, y=1, z=1: objects.scale([x, y, z])(self)),
     (["o", "offset"], ff_offset),
     (["__pow__"], lambda x, y: hull(x, y)),
     (["__xor__"], lambda x, y: x + y.h()),
 
-    (["rx"], lambda self, x: solid.rotate((x, 0, 0))(self)),
-    (["ry"], lambda self, y: solid.rotate((0, y, 0))(self)),
-    (["rz"], lambda self, z: solid.rotate((0, 0, z))(self)),
-
-    (["rzx"], solid.utils.rot_z_to_x),
-    (["rzy"], solid.utils.rot_z_to_y),
-    (["rxy"], solid.utils.rot_x_to_y),
-    (["rxz"], solid.utils.rot_z_to_neg_x),
-    (["ryx"], solid.utils.rot_x_to_neg_y),
-    (["ryz"], solid.utils.rot_z_to_neg_y),
-
-    (["x", "right"], lambda self, d: solid.utils.right(d)(self)),
-    (["left"], lambda self, d: solid.utils.left(d)(self)),  # along y
-    (["y", "forward"], lambda self, d: solid.utils.forward(d)(self)),  # along x
-    (["back"], lambda self, d: solid.utils.back(d)(self)),
-    (["z", "up"], lambda self, d: solid.utils.up(d)(self)),  # along z
-    (["down"], lambda self, d: solid.utils.down(d)(self)),
-    (["c", "color"], lambda self, c: solid.color(c)(self)),
-    (["m", "mirror"], lambda self, a, b, c: solid.mirror([a, b, c])(self)),
+    (["rx"], lambda self, x: objects.rotate((x, 0, 0))(self)),
+    (["ry"], lambda self, y: objects.rotate((0, y, 0))(self)),
+    (["rz"], lambda self, z: objects.rotate((0, 0, z))(self)),
 
-    (["e", "extrude", "linear_extrude"], ff_linear_extrude),
-    (["render"], lambda self, **kw: solid.render(**kw)(self)),
+    # same as solid.utils.rot_*, but building solidff objects
+    (["rzx"], _rot(90, FORWARD_VEC)),  # rot_z_to_x
+    (["rzy"], _rot(-90, RIGHT_VEC)),  # rot_z_to_y
+    (["rxy"], _rot(90, UP_VEC)),  # rot_x_to_y
+    (["rxz"], _rot(-90, FORWARD_VEC)),  # rot_z_to_neg_x
+    (["ryx"], _rot(-90, UP_VEC)),  # rot_x_to_neg_y
+    (["ryz"], _rot(90, RIGHT_VEC)),  # rot_z_to_neg_y
+
+    (["x", "right"], lambda self, d: objects.translate((d, 0, 0))(self)),
+    (["left"], lambda self, d: objects.translate((-d, 0, 0))(self)),  # along y
+    (["y", "forward"], lambda self, d: objects.translate((0, d, 0))(self)),  # along x
+    (["back"], lambda self, d: objects.translate((0, -d, 0))(self)),
+    (["z", "up"], lambda self, d: objects.translate((0, 0, d))(self)),  # along z
+    (["down"], lambda self, d: objects.translate((0, 0, -d))(self)),
+    (["c", "color"], lambda self, c: objects.color(c)(self)),
+    (["m", "mirror"], lambda self, a, b, c: objects.mirror([a, b, c])(self)),
 
+    (["e", "extrude", "linear_extrude"], ff_linear_extrude),
+    (["render"], lambda self, **kw: objects.render(**kw)(self)),
+]] + [
     (["dump"], dump),
     (["dump_this"], dump_this),
-])
+    (["distance"], ff_distance),
+    (["contains"], ff_contains),
+]
+
+# solidff's own objects always have the shortcuts
+patches(_shortcuts, objects.FFMixin)
+
+_unpatched = {}
+
+def patch():
+    """Add the shortcuts to every solid object (done on import,
+    unless the environment variable SOLIDFF_NO_PATCH is set)"""
+    for names, val in _shortcuts:
+        for s in names:
+            if s not in _unpatched:
+                _unpatched[s] = solid.OpenSCADObject.__dict__.get(s)
+    patches(_shortcuts)
+
+def unpatch():
+    """Remove the shortcuts from solid objects again - solidff's objects keep them"""
+    for s, val in _unpatched.items():
+        if val is None:
+            delattr(solid.OpenSCADObject, s)
+        else:
+            setattr(solid.OpenSCADObject, s, val)
+    _unpatched.clear()
+
+if not os.environ.get("SOLIDFF_NO_PATCH"):
+    patch()
 
-poly = solid.polygon
-hull = lambda *args: solid.hull()(*args)
+poly = objects.polygon
+hull = interned(lambda *args: objects.hull()(*args))
 
 def center_obj(obj, center: Union[bool, str, None] = None, x=None, y=None, z=None):
     if type(center) == bool:
@@ -120,43 +192,48 @@ def center_obj(obj, center: Union[bool, str, None] = None, x=None, y=None, z=Non
         obj = obj.z(-z/2)
     return obj
 
-def c(d=None, r=None, segments=60):
-    return solid.circle(d=d, r=r, segments=segments)
+@interned
+def c(d=None, r=None, segments=None):
+    return objects.circle(d=d, r=r, segments=_segments(segments))
 
+@interned
 def s(x, y=None, center: Union[bool, str, None] = None):
     if center == None:
         if type(y) in [int, float]:
-            return solid.square([x, y])
-        obj = lambda c:solid.square(x, center=c)
+            return objects.square([x, y])
+        obj = lambda c:objects.square(x, center=c)
         return center_obj(obj, y, x, x)
     if y == None:
-        obj = lambda c:solid.square(x, center=c)
+        obj = lambda c:objects.square(x, center=c)
         return center_obj(obj, center, x, x)
-    obj = lambda c:solid.square([x, y], center=c)
+    obj = lambda c:objects.square([x, y], center=c)
     return center_obj(obj, center, x, y)
 
-def cy(d=None, h=2, center=False, axis="z", segments=60, **kw):
+@interned
+def cy(d=None, h=2, center=False, axis="z", segments=None, **kw):
     _check_axis(axis)
-    cylinder = solid.cylinder(d=d, h=h, center=center, segments=segments, **kw)
+    segments = _segments(segments)
+    cylinder = objects.cylinder(d=d, h=h, center=center, segments=segments, **kw)
     if axis == "z":   return cylinder
     elif axis == "y": return cylinder.rzy()
     elif axis == "x": return cylinder.rzx()
 
 def sector(radius=20, angles=(45, 135)):
-    rect = solid.square([radius * 2, radius]).left(radius)
-    return solid.difference()(
-        solid.circle(20),
+    rect = objects.square([radius * 2, radius]).left(radius)
+    return objects.difference()(
+        objects.circle(20),
         rect.rotate(angles[0]),
         rect.rotate(angles[1]).mirror(math.cos(math.radians(angles[1])), math.sin(math.radians(angles[1])), 0),
     )
 
 def arc(radius=20, angles=(45, 290), width=1):
-    return solid.difference()(
+    return objects.difference()(
         sector(radius + width, angles),
         sector(radius, angles),
     )
 
-def ring(od=None, id=None, h=2, center=False, w=None, o=None, i=None, hole=False, extra=True, segments=60):
+@interned
+def ring(od=None, id=None, h=2, center=False, w=None, o=None, i=None, hole=False, extra=True, segments=None):
     if i != None and id != None:
         raise ValueError("Use only one of `i` and `id`")
     if o != None and od != None:
@@ -180,24 +257,25 @@ def ring(od=None, id=None, h=2, center=False, w=None, o=None, i=None, hole=False
             inner = cy(r=i, h=h, segments=segments)
         ring = cy(r=o, h=h, segments=segments) + inner.h()
     else:
-        ring = solid.rotate_extrude(segments=segments)(solid.square([w, h]).x(i))
+        ring = objects.rotate_extrude(segments=_segments(segments))(objects.square([w, h]).x(i))
     if center:
         return ring.z(-h / 2)
     return ring
 
+@interned
 def q(x, y=None, z=None, center: Union[bool, str, None] = None):
     """A quick cube"""
     if y is None:
         y = x
     if z is None:
         z = x
-    obj = lambda c:solid.cube([x, y, z], center=c)
+    obj = lambda c:objects.cube([x, y, z], center=c)
     return center_obj(obj, center, x, y, z)
 
 def _inner_rq(x, y, z, r, center, edges):
     xr = x / 2 - r
     yr = y / 2 - r
-    a = solid.hull()(
+    a = objects.hull()(
         (
             (cy(r, z) if 0 in edges else q(2 * r, 2 * r, z)).left(xr).forward(yr),
             (cy(r, z) if 1 in edges else q(2 * r, 2 * r, z)).left(-xr).forward(yr),
@@ -234,7 +312,7 @@ def rq(x, y=None, z=None, r=1, center=False, axis="z", edges=(0, 1, 2, 3)):
 
 def triangle90(a, b, height=1, axis="z", center=False):
     """A quick 90 degree triangle with sidelengths a,b, extruded to height"""
-    p = solid.polygon(
+    p = objects.polygon(
         [
             [0, 0],
             [a, 0],
@@ -263,4 +341,4 @@ def triangle90(a, b, height=1, axis="z", center=False):
         raise ValueError("invalid axis")
     return p
 
-b = lambda d=None, r=None, segments=60: solid.sphere(d=d, r=r, segments=segments)
+b = interned(lambda d=None, r=None, segments=None: objects.sphere(d=d, r=r, segments=_segments(segments)))
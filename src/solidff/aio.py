@@ -0,0 +1,122 @@
+# asyncio variants of dump and an openscad runner, for use inside servers
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import os
+import subprocess
+import weakref
+
+_max_concurrency = os.cpu_count() or 4
+_executor = None
+_semaphores = weakref.WeakKeyDictionary()  # event loop -> (limit, semaphore)
+
+
+def set_concurrency(n):
+    """Limit how many renders / openscad processes run at once (per event loop).
+
+    Applies to jobs started afterwards, in running event loops too;
+    jobs already running or waiting keep the old limit.
+    """
+    global _max_concurrency, _executor
+    if n < 1:
+        raise ValueError("concurrency must be at least 1")
+    _max_concurrency = n
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=_max_concurrency, thread_name_prefix="solidff"
+        )
+    return _executor
+
+
+def _limiter():
+    loop = asyncio.get_running_loop()
+    limit, sem = _semaphores.get(loop, (None, None))
+    if limit != _max_concurrency:
+        sem = asyncio.Semaphore(_max_concurrency)
+        _semaphores[loop] = (_max_concurrency, sem)
+    return sem
+
+
+def _in_context(func):
+    # executor threads don't see the caller's contextvars (solidff's Config)
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+async def adump(root, fn, prefix="", split=None, min_nodes=None, timeout=None):
+    """dump() in a worker thread, without blocking the event loop.
+
+    On timeout or cancellation the caller is released immediately,
+    the render itself can't be interrupted and finishes in the background.
+    """
+    from . import dump
+
+    async with _limiter():
+        loop = asyncio.get_running_loop()
+        job = loop.run_in_executor(
+            _get_executor(), _in_context(dump), root, fn, prefix, split, min_nodes
+        )
+        await asyncio.wait_for(job, timeout)
+
+
+async def _run_openscad(cmd):
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await proc.communicate()
+    except BaseException:  # cancelled (e.g. by a timeout) - don't leave it running
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+    return stdout, stderr
+
+
+async def acompile(
+    root,
+    output_fn,
+    scad_fn=None,
+    openscad="openscad",
+    args=(),
+    prefix="",
+    split=None,
+    timeout=None,
+):
+    """Render root (an object, or the path of a .scad file) with openscad into output_fn.
+
+    The .scad file goes to scad_fn (default: output_fn with a .scad suffix).
+    Rendering runs in a worker thread, openscad as an asyncio subprocess,
+    and both count against the concurrency limit (see set_concurrency).
+    timeout (seconds) covers the whole job; on timeout or cancellation
+    openscad is killed. A failing openscad raises subprocess.CalledProcessError.
+    Returns openscad's (stdout, stderr).
+    """
+
+    async def job():
+        async with _limiter():
+            nonlocal scad_fn
+            if isinstance(root, (str, os.PathLike)):
+                scad_fn = root
+            else:
+                from . import dump
+
+                if scad_fn is None:
+                    scad_fn = os.path.splitext(output_fn)[0] + ".scad"
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(
+                    _get_executor(), _in_context(dump), root, str(scad_fn), prefix, split
+                )
+            cmd = [openscad, *args, "-o", str(output_fn), str(scad_fn)]
+            return await _run_openscad(cmd)
+
+    return await asyncio.wait_for(job(), timeout)
@@ -0,0 +1,38 @@
+# settings of the solidff helpers, per thread / asyncio task (contextvars)
+import contextlib
+import contextvars
+from typing import NamedTuple, Optional
+
+
+class Config(NamedTuple):
+    segments: int = 60  # default $fn of cy, c, b, ring and offset
+    immutable: bool = False  # see set_immutable
+    split: bool = False  # dump defaults
+    min_nodes: int = 32
+    # dump keeps rendered text to reuse next time (see scad_render_cached);
+    # None: when immutable, where unchanged subtrees are found for free
+    cache: Optional[bool] = None
+
+
+_config = contextvars.ContextVar("solidff_config", default=Config())
+
+
+def get_config() -> Config:
+    return _config.get()
+
+
+def set_config(**kwargs):
+    """Change settings for the current context - this thread, or this asyncio
+    task and the tasks it starts. New threads start with the defaults.
+    Inside thread pools prefer configure(), pool threads are reused."""
+    _config.set(_config.get()._replace(**kwargs))
+
+
+@contextlib.contextmanager
+def configure(**kwargs):
+    """Change settings for the duration of a with block (in this context only)"""
+    token = _config.set(_config.get()._replace(**kwargs))
+    try:
+        yield _config.get()
+    finally:
+        _config.reset(token)
@@ -0,0 +1,188 @@
+# opt-in hash consing: identical subtrees become one shared, immutable object
+import solid
+import functools
+import weakref
+from solid.solidpython import _unsubbed_keyword
+from .config import get_config, set_config
+
+# structural key -> node, and constructor call -> node
+_nodes = weakref.WeakValueDictionary()
+_calls = weakref.WeakValueDictionary()
+
+
+class _Shared:
+    """Parent of every interned node.
+
+    Interned nodes have many parents, so adding them to a new parent must not
+    re-point them. Being truthy, it also keeps solid from treating them as
+    tree roots, which is harmless since interned subtrees never contain holes.
+    """
+
+    def __bool__(self):
+        return True
+
+    def __repr__(self):
+        return "<shared>"
+
+
+SHARED = _Shared()
+
+
+def set_immutable(enabled=True):
+    """Make q, cy, c, s, b, ring, hull and the patched methods return interned nodes
+    (in the current context, see set_config - or use configure(immutable=True)).
+
+    Interned nodes are shared between all users and must not be modified -
+    the patched methods never do, they copy where solid would modify.
+    Subtrees containing holes are not interned.
+    """
+    set_config(immutable=enabled)
+
+
+def is_immutable():
+    return get_config().immutable
+
+
+# tagged by small ints rather than their types: tuples of nothing but ints and
+# strings are untracked by the garbage collector, keys stay out of its way
+_ATOMS = {int: 0, str: 2, bool: 3, type(None): 4}
+_FLOAT, _LIST, _TUPLE = 1, 5, 6
+
+
+def _freeze(v):
+    # types are part of the key: 1, 1.0 and True render differently
+    t = type(v)
+    tag = _ATOMS.get(t)
+    if tag is not None:
+        return (tag, v)
+    if t is float:
+        return (_FLOAT, repr(v))  # so do 0.0 and -0.0, which compare equal
+    if t is list or t is tuple:
+        return (_LIST if t is list else _TUPLE, tuple(_freeze(x) for x in v))
+    if isinstance(v, solid.OpenSCADObject) and not is_interned(v):
+        raise TypeError("mutable node")  # might change after we looked at it
+    hash(v)  # TypeError for unhashables, e.g. numpy arrays
+    return (t, v)
+
+
+_param_names = {"segments": "$fn"}
+
+
+def _param_name(k):
+    # solid renames keys while rendering - hash what it will render
+    name = _param_names.get(k)
+    if name is None:
+        name = _param_names[k] = _unsubbed_keyword(k) if type(k) is str else k
+    return name
+
+
+def _key(node, children):
+    params = tuple(
+        sorted(
+            ((_param_name(k), _freeze(v)) for k, v in node.params.items()),
+            key=lambda kv: (type(kv[0]) is str, kv[0]),
+        )
+    )
+    return (
+        type(node),
+        node.name,
+        params,
+        node.modifier,
+        node.is_hole,
+        node.is_part_root,
+        children,
+    )
+
+
+def is_interned(node):
+    return node.parent is SHARED
+
+
+def intern(node):
+    """Return the canonical node structurally equal to node (possibly node itself).
+
+    Nodes whose children aren't interned, that contain holes or have
+    unhashable parameters are returned unchanged.
+    """
+    if is_interned(node):
+        return node
+    if node.is_hole or node.traits or not all(is_interned(c) for c in node.children):
+        return node
+    try:
+        # children are alive as long as node is, so their ids are stable
+        key = _key(node, tuple(map(id, node.children)))
+    except TypeError:
+        return node
+    existing = _nodes.get(key)
+    if existing is not None:
+        return existing
+    node.parent = SHARED
+    node.ff_hash = hash(key[:-1] + (tuple(c.ff_hash for c in node.children),))
+    _nodes[key] = node
+    return node
+
+
+def interned(func):
+    """Decorator for node returning functions and patched methods: intern the
+    result, and return the same node again when called with the same arguments
+    (interned nodes count as the same argument only if they are identical)."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        config = get_config()
+        if not config.immutable:
+            return func(*args, **kwargs)
+        try:
+            # defaults like segments come from the config
+            key = (
+                func,
+                config,
+                _freeze(args),
+                tuple((k, _freeze(v)) for k, v in kwargs.items()),
+            )
+        except TypeError:
+            return intern(func(*args, **kwargs))
+        node = _calls.get(key)
+        if node is None:
+            node = intern(func(*args, **kwargs))
+            if is_interned(node):
+                _calls[key] = node
+        return node
+
+    return wrapper
+
+
+def thaw(node):
+    """A private shallow copy of an interned node, to set modifiers etc. on"""
+    if not is_interned(node):
+        return node
+    other = object.__new__(type(node))
+    other.__dict__.update(node.__dict__)
+    other.params = dict(node.params)
+    other.children = list(node.children)
+    other.traits = {}
+    other.parent = None
+    del other.ff_hash
+    return other
+
+
+def structural_hash(node, _memo=None):
+    """Hash of a subtree's structure (names, parameters, flags, children).
+
+    Free for interned nodes, otherwise computed recursively.
+    Only stable within one process.
+    """
+    h = getattr(node, "ff_hash", None)
+    if h is not None:
+        return h
+    if _memo is None:
+        _memo = {}
+    h = _memo.get(id(node))
+    if h is None:
+        children = tuple(structural_hash(c, _memo) for c in node.children)
+        try:
+            h = hash(_key(node, children))
+        except TypeError:
+            h = hash((node.name, repr(node.params), children))
+        _memo[id(node)] = h
+    return h
@@ -0,0 +1,214 @@
+# STL post processing: weld duplicated vertices, merge coplanar triangles,
+# write binary STL / 3MF. Needs numpy.
+import mmap
+import os
+import re
+import zipfile
+
+import numpy as np
+
+_STL_DTYPE = np.dtype(
+    [("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attr", "<u2")]
+)
+
+
+def read_stl(path):
+    """Read an ascii or binary STL (memory mapped). Returns an (M, 3, 3) triangle array"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return np.zeros((0, 3, 3))
+    with open(path, "rb") as op:
+        with mmap.mmap(op.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if size >= 84:
+                count = int.from_bytes(mm[80:84], "little")
+                if size == 84 + count * _STL_DTYPE.itemsize:
+                    data = np.frombuffer(mm, _STL_DTYPE, count=count, offset=84)
+                    out = data["vertices"].astype(np.float64)
+                    del data  # release the buffer before the map closes
+                    return out
+            coords = re.findall(rb"vertex\s+(\S+)\s+(\S+)\s+(\S+)", mm)
+    coords = np.array(coords, dtype="S").astype(np.float64)
+    if len(coords) % 3:
+        raise ValueError(f"{path}: vertex count is not a multiple of 3")
+    return coords.reshape(-1, 3, 3)
+
+
+def weld(triangles, tolerance=1e-6):
+    """Merge vertices closer than ~tolerance, drop degenerate triangles.
+
+    Returns (vertices (N, 3), faces (M, 3) int).
+    """
+    points = triangles.reshape(-1, 3)
+    keys = np.round(points / tolerance).astype(np.int64)
+    # one 24 byte key per point - np.unique on a 1d array instead of rows
+    keys = np.ascontiguousarray(keys).view(np.dtype((np.void, 24))).ravel()
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    vertices = points[first]
+    faces = inverse.reshape(-1, 3)
+    return vertices, _drop_degenerate(faces)
+
+
+def _drop_degenerate(faces):
+    ok = (
+        (faces[:, 0] != faces[:, 1])
+        & (faces[:, 1] != faces[:, 2])
+        & (faces[:, 0] != faces[:, 2])
+    )
+    return faces[ok]
+
+
+def _normals(vertices, faces):
+    v = vertices[faces]
+    n = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+    length = np.linalg.norm(n, axis=1, keepdims=True)
+    return np.divide(n, length, out=np.zeros_like(n), where=length > 0)
+
+
+def _edge_counts(faces):
+    """(sorted edges (3M, 2), how many faces use each of them)"""
+    edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    keys = edges[:, 0].astype(np.int64) * (int(faces.max(initial=0)) + 1) + edges[:, 1]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return edges, counts[inverse]
+
+
+def _collapse_pass(vertices, faces, cos_tol, rng):
+    n_vertices = len(vertices)
+    normals = _normals(vertices, faces)
+
+    # flat vertices: all incident faces within tolerance of one of them
+    ref = np.zeros((n_vertices, 3))
+    for k in range(3):
+        ref[faces[:, k]] = normals
+    min_dot = np.full(n_vertices, 2.0)
+    for k in range(3):
+        np.minimum.at(min_dot, faces[:, k], np.sum(normals * ref[faces[:, k]], axis=1))
+    flat = min_dot >= cos_tol
+    # keep the borders of open or non-manifold surfaces
+    edges, counts = _edge_counts(faces)
+    flat[edges[counts != 2].ravel()] = False
+    if not flat.any():
+        return faces, 0
+
+    # candidates that don't share a face with a higher priority one,
+    # so all of them can be collapsed at once
+    priority = np.where(flat, rng.random(n_vertices), -1.0)
+    face_max = priority[faces].max(axis=1)
+    vertex_max = np.full(n_vertices, -1.0)
+    for k in range(3):
+        np.maximum.at(vertex_max, faces[:, k], face_max)
+    chosen = flat & (priority == vertex_max)
+
+    # collapse each chosen vertex onto a neighbour along one of its edges
+    target = np.arange(n_vertices)
+    for k in range(3):
+        v, u = faces[:, k], faces[:, (k + 1) % 3]
+        target[v[chosen[v]]] = u[chosen[v]]
+
+    while chosen.any():
+        mapping = np.where(chosen, target, np.arange(n_vertices))
+        new_faces = mapping[faces]
+        alive = (
+            (new_faces[:, 0] != new_faces[:, 1])
+            & (new_faces[:, 1] != new_faces[:, 2])
+            & (new_faces[:, 0] != new_faces[:, 2])
+        )
+        affected = chosen[faces].any(axis=1)
+        # no flipped or squashed triangles
+        bad_face = affected & alive
+        new_normals = _normals(vertices, new_faces[bad_face])
+        bad_face[bad_face] = np.sum(new_normals * normals[bad_face], axis=1) < cos_tol
+        # and no edges shared by more than two triangles (link condition)
+        edges, counts = _edge_counts(new_faces[alive])
+        over = np.zeros(len(faces), bool)
+        over[np.flatnonzero(alive)] = (counts > 2).reshape(-1, 3).any(axis=1)
+        bad_face |= over & affected
+        if not bad_face.any():
+            return new_faces[alive], int(chosen.sum())
+        bad = np.zeros(n_vertices, bool)
+        bad[faces[bad_face].ravel()] = True
+        chosen &= ~bad
+    return faces, 0
+
+
+def decimate(vertices, faces, tolerance=0.01, max_passes=100, seed=0):
+    """Remove vertices inside flat regions by collapsing them onto a neighbour.
+
+    A vertex is flat when the normals of all its triangles are within
+    tolerance degrees of each other; borders and creases are kept.
+    Returns (vertices, faces), with unused vertices dropped.
+    """
+    cos_tol = np.cos(np.radians(tolerance))
+    rng = np.random.default_rng(seed)
+    faces = _drop_degenerate(np.asarray(faces))
+    for _ in range(max_passes):
+        faces, removed = _collapse_pass(vertices, faces, cos_tol, rng)
+        if not removed:
+            break
+    used, faces = np.unique(faces, return_inverse=True)
+    return vertices[used], faces.reshape(-1, 3)
+
+
+def write_stl(path, vertices, faces):
+    """Binary STL"""
+    data = np.zeros(len(faces), _STL_DTYPE)
+    data["vertices"] = vertices[faces]
+    data["normal"] = _normals(vertices, faces)
+    with open(path, "wb") as op:
+        op.write(b"solidff".ljust(80, b" "))
+        op.write(np.uint32(len(faces)).tobytes())
+        data.tofile(op)
+
+
+_3MF_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+ <Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+ <Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>
+</Types>
+"""
+_3MF_RELS = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+ <Relationship Target="/3D/3dmodel.model" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>
+</Relationships>
+"""
+
+
+def write_3mf(path, vertices, faces, unit="millimeter"):
+    """3MF (a zip of xml), vertices and triangles are stored once each"""
+    vertex_xml = "".join(
+        f'<vertex x="{x:.9g}" y="{y:.9g}" z="{z:.9g}"/>\n'
+        for x, y, z in vertices.tolist()
+    )
+    triangle_xml = "".join(
+        f'<triangle v1="{a}" v2="{b}" v3="{c}"/>\n' for a, b, c in faces.tolist()
+    )
+    model = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<model unit="{unit}" xml:lang="en-US" '
+        'xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n'
+        '<resources>\n<object id="1" type="model">\n<mesh>\n'
+        f"<vertices>\n{vertex_xml}</vertices>\n"
+        f"<triangles>\n{triangle_xml}</triangles>\n"
+        '</mesh>\n</object>\n</resources>\n<build>\n<item objectid="1"/>\n</build>\n'
+        "</model>\n"
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _3MF_CONTENT_TYPES)
+        z.writestr("_rels/.rels", _3MF_RELS)
+        z.writestr("3D/3dmodel.model", model)
+
+
+def compress(input_fn, output_fn=None, decimate_tolerance=None, weld_tolerance=1e-6):
+    """Read an STL, weld it, optionally decimate(decimate_tolerance degrees)
+    and write it as binary STL or 3MF (by output_fn's suffix, default: overwrite input_fn).
+    Returns the number of triangles written."""
+    if output_fn is None:
+        output_fn = input_fn
+    vertices, faces = weld(read_stl(input_fn), weld_tolerance)
+    if decimate_tolerance is not None:
+        vertices, faces = decimate(vertices, faces, decimate_tolerance)
+    if str(output_fn).lower().endswith(".3mf"):
+        write_3mf(output_fn, vertices, faces)
+    else:
+        write_stl(output_fn, vertices, faces)
+    return len(faces)
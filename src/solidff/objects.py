@@ -0,0 +1,58 @@
+# solid.objects classes with solidff's shortcut methods mixed in,
+# so solidff works without patching solid.OpenSCADObject
+import solid
+import solid.objects
+from .interning import SHARED, interned
+
+
+class FFMixin:
+    """The shortcut methods (t, r, x, h, e, ...) are added by solidff.patches"""
+
+    def set_parent(self, parent):
+        # interned nodes are shared, adding them somewhere must not re-point them
+        if self.parent is not SHARED:
+            self.parent = parent
+
+    @interned
+    def __add__(self, x):
+        return _extend(union, self, x)  # noqa: F821
+
+    @interned
+    def __radd__(self, x):
+        return union()(self, x)  # noqa: F821
+
+    @interned
+    def __sub__(self, x):
+        return _extend(difference, self, x)  # noqa: F821
+
+    @interned
+    def __mul__(self, x):
+        return _extend(intersection, self, x)  # noqa: F821
+
+
+def _extend(cls, a, b):
+    # like solid: a + b + c is one union (same for - and *).
+    # a's children are copied over, a itself is left alone (it may be shared)
+    if isinstance(a, getattr(solid.objects, cls.__name__)):
+        new = cls()
+        for child in a.children:
+            new.add(child)
+        return new.add(b)
+    return cls()(a, b)
+
+
+def _mixed(cls):
+    return type(
+        cls.__name__, (FFMixin, cls), {"__module__": __name__, "__qualname__": cls.__name__}
+    )
+
+
+OpenSCADObject = _mixed(solid.OpenSCADObject)
+for _name, _cls in list(vars(solid.objects).items()):
+    if (
+        isinstance(_cls, type)
+        and issubclass(_cls, solid.OpenSCADObject)
+        and _cls.__module__ == solid.objects.__name__
+    ):
+        globals()[_name] = _mixed(_cls)
+del _name, _cls
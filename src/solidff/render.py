@@ -0,0 +1,361 @@
+# rendering helpers beyond plain solid.scad_render
+import solid
+from . import objects
+from .interning import _key, is_interned
+from solid.solidpython import (
+    IncludedOpenSCADObject,
+    _find_include_strings,
+    indent,
+    non_rendered_classes,
+)
+import collections
+import hashlib
+import itertools
+import os
+import threading
+import weakref
+
+
+def _tree_info(node, memo):
+    """(node count, contains holes) of a subtree - memoized by id, trees may share nodes"""
+    key = id(node)
+    if key not in memo:
+        size = 1
+        holes = node.is_hole
+        for child in node.children:
+            child_size, child_holes = _tree_info(child, memo)
+            size += child_size
+            # holes below a part root are subtracted there and don't escape
+            holes = holes or (child_holes and not child.is_part_root)
+        memo[key] = (size, holes)
+    return memo[key]
+
+
+class _Splitter:
+    def __init__(self, frag_dir, rel_dir, min_nodes, cache):
+        self.frag_dir = frag_dir
+        self.cache = cache
+        self.rel_dir = rel_dir
+        self.min_nodes = min_nodes
+        self.info = {}
+        self.fragments = {}  # id(node) -> module name
+
+    def splittable(self, node):
+        size, holes = _tree_info(node, self.info)
+        return size >= self.min_nodes and (not holes or node.is_part_root)
+
+    def rebuild(self, node, uses, use_dir):
+        """Copy the tree, replacing large subtrees by calls to fragment modules
+        (`use`d from use_dir - OpenSCAD resolves `use` relative to the using file).
+
+        Subtrees without any fragments below them are reused as is.
+        """
+        children = []
+        changed = False
+        for child in node.children:
+            if self.splittable(child):
+                name = self.fragment(child)
+                uses.add(f"use <{use_dir}{name}.scad>\n")
+                children.append(objects.OpenSCADObject(name, {}))
+                changed = True
+            else:
+                new_child = self.rebuild(child, uses, use_dir)
+                changed = changed or new_child is not child
+                children.append(new_child)
+        if not changed:
+            return node
+        out = objects.OpenSCADObject(node.name, dict(node.params))
+        out.modifier = node.modifier
+        out.is_hole = node.is_hole
+        out.is_part_root = node.is_part_root
+        out.parent = node.parent
+        out.children = children
+        return out
+
+    def fragment(self, node):
+        if id(node) in self.fragments:
+            return self.fragments[id(node)]
+        uses = set()
+        # splittable nodes have no holes escaping them, so rendering them
+        # standalone gives the same code as rendering them in place
+        code = self.cache.render_node(self.rebuild(node, uses, ""))
+        header = "".join(sorted(uses)) + "".join(sorted(_find_include_strings(node)))
+        digest = hashlib.sha1((header + code).encode("utf-8")).hexdigest()[:16]
+        name = f"frag_{digest}"
+        self.fragments[id(node)] = name
+        fn = os.path.join(self.frag_dir, name + ".scad")
+        if not os.path.exists(fn):
+            code = header + f"\nmodule {name}() {{" + indent(code) + "\n}\n"
+            _write_atomic(fn, code.encode("utf-8"))
+        return name
+
+    def prune(self):
+        """Remove the fragment files this render doesn't use (left by earlier ones)"""
+        used = {name + ".scad" for name in self.fragments.values()}
+        for entry in os.scandir(self.frag_dir):
+            if entry.name.startswith("frag_") and entry.name.endswith(".scad") and entry.name not in used:
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:  # pruned concurrently
+                    pass
+
+
+def _write_atomic(fn, content):
+    # existing files are trusted, so never leave a partial one behind
+    tmp = f"{fn}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as op:
+            op.write(content)
+        os.replace(tmp, fn)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+# text kinds cached per subtree: positive geometry (as a child / as a tree or
+# part root, i.e. with its holes subtracted), the same inside a hole, and the
+# hole section a root collects from below the node
+_CHILD, _ROOT, _HOLE_CHILD, _HOLE_ROOT, _HOLES = range(5)
+
+# cache keys of interned nodes - they never change
+_keys = weakref.WeakKeyDictionary()
+_keys_lock = threading.Lock()
+_serials = itertools.count()
+
+
+class _Entry:
+    __slots__ = ("marked", "includes", "texts", "size", "key", "serial")
+
+    def __init__(self, marked, includes, key):
+        self.marked = marked  # solid's has_hole_children
+        self.includes = includes
+        self.texts = {}
+        self.size = 0
+        self.key = key  # None: not cached
+        # stands for the subtree in its parent's key; never reused, so keys
+        # holding the serials of dropped entries just don't match anymore
+        self.serial = next(_serials)
+
+
+class RenderCache:
+    """Rendered text of subtrees, keyed by structure (a node's own key as in
+    interning, with its children's entries), least recently used ones dropped
+    beyond max_chars characters.
+
+    Rendering through it gives the same code as solid.scad_render, but only
+    subtrees not seen before are rendered - after a small change that is the
+    path from the change up to the root. Keying a tree still visits every
+    node, unless it is interned (see set_immutable), where keys are kept.
+
+    Differences to solid: includes are sorted, and no empty blocks show up
+    in the holes section (solid's hole search leaves nodes with part root
+    children on its path, which then get wrapped around nothing).
+    """
+
+    def __init__(self, max_chars=2**26):
+        self.max_chars = max_chars
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def render(self, root, file_header=""):
+        """like solid.scad_render"""
+        memo = {}
+        entry = self._entry(root, memo)
+        code = self._text(root, self._child_kind(root, False), memo)
+        if file_header and not file_header.endswith("\n"):
+            file_header += "\n"
+        return file_header + "".join(sorted(entry.includes)) + "\n" + code
+
+    def render_node(self, node):
+        """like node._render()"""
+        return self._text(node, self._child_kind(node, False), {})
+
+    def _entry(self, node, memo):
+        """node's entry, memoized by id for this render"""
+        entry = memo.get(id(node))
+        if entry is not None:
+            return entry
+        interned = is_interned(node)
+        key = None
+        if interned:
+            with _keys_lock:
+                key = _keys.get(node)
+        entry = None if key is None else self._get(key)
+        if entry is None:
+            children = [self._entry(c, memo) for c in node.children]
+            key = None
+            if all(e.key is not None for e in children):
+                try:
+                    key = _key(node, tuple(e.serial for e in children))
+                except TypeError:  # unhashable parameters - render, don't cache
+                    pass
+                else:
+                    if isinstance(node, IncludedOpenSCADObject):
+                        key += (node.include_string,)
+                    entry = self._get(key)
+                    if entry is not None:
+                        key = entry.key  # the fresh one would only take up memory
+                    if interned:
+                        with _keys_lock:
+                            _keys[node] = key
+        if entry is None:
+            marked = any(
+                c.is_hole or (e.marked and not c.is_part_root)
+                for c, e in zip(node.children, children)
+            )
+            includes = set()
+            if isinstance(node, IncludedOpenSCADObject):
+                includes.add(node.include_string)
+            for e in children:
+                includes.update(e.includes)
+            for v in node.params.values():
+                if isinstance(v, solid.OpenSCADObject):
+                    includes.update(_find_include_strings(v))
+            if self.max_chars <= 0:
+                key = None
+            entry = _Entry(marked, frozenset(includes), key)
+            if key is not None:
+                with self._lock:
+                    entry = self._entries.setdefault(key, entry)
+        memo[id(node)] = entry
+        return entry
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _text(self, node, kind, memo):
+        entry = self._entry(node, memo)
+        text = entry.texts.get(kind)
+        if text is None:
+            text = self._render(node, kind, entry, memo)
+            with self._lock:
+                # count it unless the entry was dropped meanwhile or another
+                # thread got there first
+                key = entry.key
+                if kind not in entry.texts and key is not None and self._entries.get(key) is entry:
+                    entry.size += len(text)
+                    self._size += len(text)
+                entry.texts[kind] = text
+                self._evict()
+        return text
+
+    def _evict(self):
+        while self._size > self.max_chars and self._entries:
+            _, old = self._entries.popitem(last=False)
+            self._size -= old.size
+
+    def _child_kind(self, child, in_hole):
+        rooted = not child.parent or child.is_part_root
+        if in_hole:
+            return _HOLE_ROOT if rooted else _HOLE_CHILD
+        return _ROOT if rooted else _CHILD
+
+    def _render(self, node, kind, entry, memo):
+        # mirrors OpenSCADObject._render / _render_hole_children
+        if type(node)._render is not solid.OpenSCADObject._render:
+            if kind == _HOLES:
+                return node._render_hole_children()
+            return node._render(render_holes=kind in (_HOLE_CHILD, _HOLE_ROOT))
+        if kind == _HOLES:
+            s = "".join(
+                self._text(c, self._child_kind(c, True), memo)
+                if c.is_hole
+                else self._text(c, _HOLES, memo)
+                for c in node.children
+                # part roots included: solid marks them while rendering them
+                if c.is_hole or self._entry(c, memo).marked
+            )
+            if node.name not in non_rendered_classes:
+                s = node._render_str_no_children() + "{" + indent(s) + "\n}"
+            return s.replace("intersection", "union").replace("difference", "union")
+        in_hole = kind in (_HOLE_CHILD, _HOLE_ROOT)
+        s = "".join(
+            self._text(c, self._child_kind(c, in_hole), memo)
+            for c in node.children
+            if in_hole or not c.is_hole
+        )
+        if node.name in non_rendered_classes:
+            pass
+        elif not node.children:
+            s = node._render_str_no_children() + ";"
+        else:
+            s = node._render_str_no_children() + " {" + indent(s) + "\n}"
+        if kind in (_ROOT, _HOLE_ROOT) and entry.marked:
+            s += "\n/* Holes Below*/" + self._text(node, _HOLES, memo)
+            s = "\ndifference(){" + indent(s) + " /* End Holes */ \n}"
+        return s
+
+
+_cache = RenderCache()
+
+
+def set_cache_size(max_chars):
+    """Bound the text kept by the render cache (0 disables it)"""
+    with _cache._lock:
+        _cache.max_chars = max_chars
+        _cache._evict()
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def scad_render_cached(root, file_header=""):
+    """solid.scad_render, reusing the text of subtrees rendered before.
+
+    Meant for long running processes that re-render slightly changed trees
+    (watch loops, notebooks): only the subtrees that changed are rendered again.
+    """
+    return _cache.render(root, file_header)
+
+
+def scad_render_split(root, fn, min_nodes=32, cached=True, prune=True):
+    """Render root for file fn, moving every subtree of at least min_nodes nodes
+    into a content hashed module file in '<fn>_fragments/' that gets `use`d.
+
+    Fragment files that already exist are not rewritten, so after a small change
+    only the fragments on the path to the change are written again.
+    Subtrees with holes in them stay inline unless they are part roots,
+    since their holes are subtracted further up the tree.
+    With cached=False, rendered text isn't kept for the next call.
+    With prune, fragment files left by earlier renders that this one doesn't
+    use are removed (dump does that only after writing fn).
+    """
+    code, splitter = _split(root, fn, min_nodes, cached)
+    if prune:
+        splitter.prune()
+    return code
+
+
+def _split(root, fn, min_nodes, cached):
+    base = os.path.splitext(fn)[0]
+    rel_dir = os.path.basename(base) + "_fragments"
+    frag_dir = os.path.join(os.path.dirname(fn), rel_dir)
+    os.makedirs(frag_dir, exist_ok=True)
+    cache = _cache if cached else RenderCache()
+    splitter = _Splitter(frag_dir, rel_dir, min_nodes, cache)
+    uses = set()
+    top = splitter.rebuild(root, uses, rel_dir + "/")
+    return cache.render(top, file_header="".join(sorted(uses))), splitter
+
+
+def write_if_changed(fn, content):
+    """Write content to fn unless it already holds exactly that. Returns True if written"""
+    content = content.encode("utf-8")
+    if os.path.exists(fn) and os.path.getsize(fn) == len(content):
+        with open(fn, "rb") as op:
+            if op.read() == content:
+                return False
+    _write_atomic(fn, content)
+    return True
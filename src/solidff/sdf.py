@@ -0,0 +1,445 @@
+# signed distance of points to a solid tree, without OpenSCAD. Needs numpy.
+#
+# Negative inside, positive outside. Exact for primitives under rigid
+# transforms; unions, differences, intersections and scaling give a bound
+# with the right sign, so contains() is exact for them. offset needs exact
+# distances below it and raises NotImplementedError where it only has a bound.
+# Primitives are taken as the ideal shapes ($fn / segments are ignored).
+import copy
+import numpy as np
+import solid
+from .interning import structural_hash
+
+# nodes that just group their children
+_PASSTHROUGH = {"union", "color", "render", "hole", "part", "assign"}
+_NOT_RENDERED = {"%", "*"}  # background and disabled objects
+
+
+def _param(params, *names, default=None):
+    for name in names:
+        v = params.get(name)
+        if v is not None:
+            return v
+    return default
+
+
+def _vec3(v, fill=0.0):
+    v = np.atleast_1d(np.asarray(v, dtype=float))
+    if v.size == 1:
+        return np.repeat(v, 3)
+    return np.concatenate([v, np.full(3 - v.size, fill)])
+
+
+def _box(p, half):
+    q = np.abs(p) - half
+    return np.linalg.norm(np.maximum(q, 0), axis=1) + np.minimum(q.max(axis=1), 0)
+
+
+def _cone(p, h, r1, r2, center):
+    """Capped cone from z=0 (radius r1) to z=h (radius r2), exact"""
+    hh = h / 2
+    qx = np.linalg.norm(p[:, :2], axis=1)
+    qy = p[:, 2] - (0 if center else hh)
+    k1 = np.array([r2, hh])
+    k2 = np.array([r2 - r1, 2 * hh])
+    ca_x = qx - np.minimum(qx, np.where(qy < 0, r1, r2))
+    ca_y = np.abs(qy) - hh
+    t = np.clip(((k1[0] - qx) * k2[0] + (k1[1] - qy) * k2[1]) / (k2 @ k2), 0, 1)
+    cb_x = qx - k1[0] + k2[0] * t
+    cb_y = qy - k1[1] + k2[1] * t
+    sign = np.where((cb_x < 0) & (ca_y < 0), -1.0, 1.0)
+    return sign * np.sqrt(np.minimum(ca_x**2 + ca_y**2, cb_x**2 + cb_y**2))
+
+
+def _polygon(p, points, paths):
+    points = np.asarray(points, dtype=float)[:, :2]
+    if paths is None:
+        paths = [range(len(points))]
+    starts, ends = [], []
+    for path in paths:
+        idx = np.asarray(list(path))
+        starts.append(points[idx])
+        ends.append(points[np.roll(idx, -1)])
+    a, b = np.concatenate(starts), np.concatenate(ends)
+    xy = p[:, None, :2]
+    ab = b - a
+    ap = xy - a
+    t = np.clip(np.sum(ap * ab, axis=2) / np.maximum(np.sum(ab * ab, axis=1), 1e-300), 0, 1)
+    dist = np.linalg.norm(ap - t[..., None] * ab, axis=2).min(axis=1)
+    # even-odd crossing count, so holes given as extra paths work
+    y = xy[..., 1]
+    crosses = (a[:, 1] > y) != (b[:, 1] > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_at = a[:, 0] + (y - a[:, 1]) * ab[:, 0] / ab[:, 1]
+    inside = (crosses & (xy[..., 0] < x_at)).sum(axis=1) % 2 == 1
+    return np.where(inside, -dist, dist)
+
+
+def _rotation(params):
+    a = _param(params, "a", default=0)
+    v = params.get("v")
+    if np.ndim(a) == 0:
+        axis = np.array([0.0, 0, 1]) if v is None else _vec3(v)
+        axis = axis / np.linalg.norm(axis)
+        x, y, z = axis
+        k = np.array([[0, -z, y], [z, 0, -x], [-y, x, 0]])
+        t = np.radians(a)
+        return np.eye(3) + np.sin(t) * k + (1 - np.cos(t)) * k @ k
+    ax, ay, az = np.radians(_vec3(a))
+    rx = np.array([[1, 0, 0], [0, np.cos(ax), -np.sin(ax)], [0, np.sin(ax), np.cos(ax)]])
+    ry = np.array([[np.cos(ay), 0, np.sin(ay)], [0, 1, 0], [-np.sin(ay), 0, np.cos(ay)]])
+    rz = np.array([[np.cos(az), -np.sin(az), 0], [np.sin(az), np.cos(az), 0], [0, 0, 1]])
+    return rz @ ry @ rx  # x first, like OpenSCAD
+
+
+def _affine(node):
+    """(3x3, offset) of a transform node, or None"""
+    params = node.params
+    name = node.name
+    if name == "translate":
+        return np.eye(3), _vec3(_param(params, "v", default=0))
+    if name == "rotate":
+        return _rotation(params), np.zeros(3)
+    if name == "scale":
+        return np.diag(_vec3(_param(params, "v", default=1), fill=1)), np.zeros(3)
+    if name == "mirror":
+        n = _vec3(_param(params, "v", default=(1, 0, 0)))
+        n = n / np.linalg.norm(n)
+        return np.eye(3) - 2 * np.outer(n, n), np.zeros(3)
+    if name == "multmatrix":
+        m = np.eye(4)
+        given = np.asarray(_param(params, "m"), dtype=float)
+        m[: given.shape[0], : given.shape[1]] = given
+        return m[:3, :3], m[:3, 3]
+    return None
+
+
+class _Evaluator:
+    def __init__(self):
+        self.hole_trees = {}  # id(node) -> its holes as a tree of their own
+        self.positives = {}
+
+    def part(self, node, p):
+        """a part root: its geometry minus all holes below it"""
+        d = self.eval(node, p)
+        holes = self.holes(node, p)
+        if holes is not None:
+            d = np.maximum(d, -holes)
+        return d
+
+    def children(self, node, p):
+        d = np.full(len(p), np.inf)
+        for child in node.children:
+            if not child.is_hole:
+                d = np.minimum(d, self.child(child, p))
+        return d
+
+    def child(self, node, p):
+        return self.part(node, p) if node.is_part_root else self.eval(node, p)
+
+    def eval(self, node, p):
+        if node.modifier in _NOT_RENDERED:
+            return np.full(len(p), np.inf)
+        body = getattr(node, "body", None)
+        if body is not None:  # a sweep.Module placement
+            return self.part(body, p)
+        name = node.name
+        params = node.params
+        if name in _PASSTHROUGH:
+            return self.children(node, p)
+        if name == "difference" or name == "intersection":
+            kids = [c for c in node.children if not c.is_hole]
+            if not kids:
+                return np.full(len(p), np.inf)
+            d = self.child(kids[0], p)
+            for child in kids[1:]:
+                other = self.child(child, p)
+                d = np.maximum(d, -other if name == "difference" else other)
+            return d
+        affine = _affine(node)
+        if affine is not None:
+            q, factor = self._local(affine, p)
+            return self.children(node, q) * factor
+        if name == "hull":
+            return self.hull(node, p)
+
+        if name == "cube":
+            size = _vec3(_param(params, "size", default=1))
+            center = bool(_param(params, "center", default=False))
+            return _box(p - (0 if center else size / 2), size / 2)
+        if name == "sphere":
+            r = _param(params, "r", default=None)
+            if r is None:
+                r = _param(params, "d", default=2) / 2
+            return np.linalg.norm(p, axis=1) - r
+        if name == "cylinder":
+            h = _param(params, "h", default=1)
+            r = _param(params, "r", default=None)
+            if r is None and params.get("d") is not None:
+                r = params["d"] / 2
+            r = 1 if r is None else r
+            r1 = _param(params, "r1", default=None)
+            r1 = params["d1"] / 2 if r1 is None and params.get("d1") is not None else r1
+            r2 = _param(params, "r2", default=None)
+            r2 = params["d2"] / 2 if r2 is None and params.get("d2") is not None else r2
+            center = bool(_param(params, "center", default=False))
+            return _cone(p, h, r if r1 is None else r1, r if r2 is None else r2, center)
+        if name in _FLAT:
+            return _flat(name, params, p, 0)
+        if name == "offset":
+            return self.offset(node, p)
+        if name == "linear_extrude":
+            if params.get("twist") or np.any(np.asarray(_param(params, "scale", default=1)) != 1):
+                raise NotImplementedError("linear_extrude with twist or scale")
+            h = _param(params, "height", default=1)
+            center = bool(_param(params, "center", default=False))
+            d2 = self.children(node, p)
+            dz = np.abs(p[:, 2] - (0 if center else h / 2)) - h / 2
+            return _extruded(d2, dz)
+        if name == "rotate_extrude":
+            angle = _param(params, "angle", default=360)
+            if angle < 360:
+                raise NotImplementedError("rotate_extrude with angle < 360")
+            q = np.zeros_like(p)
+            q[:, 0] = np.linalg.norm(p[:, :2], axis=1)
+            q[:, 1] = p[:, 2]
+            return self.children(node, q)
+        raise NotImplementedError(f"no distance function for {name}()")
+
+    def offset(self, node, p):
+        kids = [c for c in node.children if not c.is_hole]
+        r = node.params.get("r")
+        if r is not None:
+            # exact outside is enough to grow; shrinking needs exact inside too
+            if not all(_exact(c, outside=r >= 0) for c in kids) or (r < 0 and len(kids) > 1):
+                raise NotImplementedError("offset(r) of a shape without exact distances")
+            return self.children(node, p) - r
+        if node.params.get("chamfer"):
+            raise NotImplementedError("offset with chamfer")
+        delta = node.params.get("delta") or 0
+        # sharp corners: grow the one shape itself, edges moved out along their normals
+        linear, offset, shape = _placement(kids[0]) if len(kids) == 1 else (None, None, None)
+        if shape is None or shape.name not in _FLAT or not _rigid(linear):
+            raise NotImplementedError("offset(delta) of anything but a single circle, square or polygon")
+        return _flat(shape.name, shape.params, (p - offset) @ linear, delta)
+
+    def hull(self, node, p):
+        """hull of two placements of one object, as hull_chain / sweep / ** build them.
+
+        With equal linear parts it is the object swept along the segment between
+        the placements (exact for convex objects); otherwise the union of the
+        placements interpolated in between (a close approximation for the thin
+        slices of sweep).
+        """
+        kids = [c for c in node.children if not c.is_hole]
+        if len(kids) == 1:
+            kids = kids * 2
+        if len(kids) != 2:
+            raise NotImplementedError("hull() of more than two objects")
+        (l1, o1, core), (l2, o2, other) = map(_placement, kids)
+        if core is not other and structural_hash(core) != structural_hash(other):
+            raise NotImplementedError("hull() of two different objects")
+
+        def at(s):
+            s = s[:, None]
+            linear = l1 if same_linear else (1 - s)[:, None] * l1 + s[:, None] * l2
+            offset = (1 - s) * o1 + s * o2
+            if same_linear:
+                q, factor = self._local((linear, np.zeros(3)), p - offset)
+            else:
+                q = np.linalg.solve(linear, (p - offset)[..., None])[..., 0]
+                factor = np.linalg.svd(linear, compute_uv=False).min(axis=1)
+            return self.child(core, q) * factor
+
+        same_linear = np.allclose(l1, l2)
+        n = len(p)
+        if same_linear:
+            # distance to a convex set is convex along the segment
+            lo, hi = np.zeros(n), np.ones(n)
+        else:
+            # bracket the best of a coarse scan, then refine like above
+            steps = np.linspace(0, 1, 17)
+            best = np.argmin([at(np.full(n, t)) for t in steps], axis=0)
+            lo, hi = steps[np.maximum(best - 1, 0)], steps[np.minimum(best + 1, 16)]
+        ratio = (np.sqrt(5) - 1) / 2
+        a, b = hi - ratio * (hi - lo), lo + ratio * (hi - lo)
+        fa, fb = at(a), at(b)
+        for _ in range(40):
+            left = fa < fb
+            hi = np.where(left, b, hi)
+            lo = np.where(left, lo, a)
+            new = np.where(left, hi - ratio * (hi - lo), lo + ratio * (hi - lo))
+            f_new = at(new)
+            a, fa, b, fb = (
+                np.where(left, new, b),
+                np.where(left, f_new, fb),
+                np.where(left, a, new),
+                np.where(left, fa, f_new),
+            )
+        return np.minimum(np.minimum(fa, fb), np.minimum(at(lo), at(hi)))
+
+    def _local(self, affine, p):
+        linear, offset = affine
+        # points into the child frame; distances there shrink / grow by at
+        # most the singular values of the linear part
+        q = np.linalg.solve(linear, (p - offset).T).T
+        factor = np.linalg.svd(linear, compute_uv=False).min()
+        return q, factor
+
+    def holes(self, node, p):
+        """distance to the holes below node (not below other part roots), or None"""
+        tree = self.hole_tree(node)
+        return None if tree is None else self.eval(tree, p)
+
+    def hole_tree(self, node):
+        """what solid renders as node's holes section: node's operation applied to
+        the holes below it (difference / intersection become unions), or None"""
+        key = id(node)
+        if key not in self.hole_trees:
+            kids, marked = [], False
+            for child in node.children:
+                if child.is_hole:
+                    kids.append(self.positive(child))
+                    marked = True
+                else:
+                    tree = self.hole_tree(child)
+                    if tree is not None:
+                        kids.append(tree)
+                        # a part root's holes only join a section that exists anyway
+                        marked = marked or not child.is_part_root
+            tree = None
+            if marked:
+                name = node.name
+                if name in ("difference", "intersection"):
+                    name = "union"
+                tree = solid.OpenSCADObject(name, node.params)
+                tree.modifier = node.modifier
+                tree.children = kids
+            self.hole_trees[key] = tree
+        return self.hole_trees[key]
+
+    def positive(self, node):
+        """node with itself and the holes inside it as plain geometry
+        (solid renders hole subtrees like that)"""
+        key = id(node)
+        if key not in self.positives:
+            out = copy.copy(node)
+            out.is_hole = False
+            out.children = [self.positive(c) for c in node.children]
+            self.positives[key] = out
+        return self.positives[key]
+
+
+def _placement(node):
+    """(linear, offset, object) of a chain of single child transforms"""
+    linear, offset = np.eye(3), np.zeros(3)
+    while len(node.children) == 1 and not node.modifier:
+        affine = _affine(node)
+        if affine is None:
+            if node.name not in ("union", "color", "render") or node.is_part_root:
+                break
+            affine = (np.eye(3), np.zeros(3))
+        child = node.children[0]
+        if child.is_hole:
+            break
+        offset = offset + linear @ affine[1]
+        linear = linear @ affine[0]
+        node = child
+    return linear, offset, node
+
+
+_FLAT = {"circle", "square", "polygon"}
+_EXACT = _FLAT | {"cube", "sphere", "cylinder"}
+
+
+def _flat(name, params, p, delta):
+    """distance to a 2d primitive, grown by delta with sharp corners"""
+    if name == "circle":
+        r = _param(params, "r", default=None)
+        if r is None:
+            r = _param(params, "d", default=2) / 2
+        return np.linalg.norm(p[:, :2], axis=1) - r - delta
+    if name == "square":
+        size = _vec3(_param(params, "size", default=1))[:2]
+        center = bool(_param(params, "center", default=False))
+        return _box(p[:, :2] - (0 if center else size / 2), size / 2 + delta)
+    points, paths = params["points"], params.get("paths")
+    if delta:
+        points = _mitered(points, paths, delta)
+    return _polygon(p, points, paths)
+
+
+def _mitered(points, paths, delta):
+    """polygon points moved so every edge is pushed out by delta"""
+    points = np.asarray(points, dtype=float)[:, :2]
+    out = points.copy()
+    for path in [range(len(points))] if paths is None else paths:
+        idx = np.asarray(list(path))
+        a, b = points[idx], points[np.roll(idx, -1)]
+        edge = b - a
+        length = np.linalg.norm(edge, axis=1, keepdims=True)
+        normal = np.stack([edge[:, 1], -edge[:, 0]], axis=1) / length
+        # which side is out - paths may run either way and be holes
+        probe = (a + b) / 2 + normal * length * 1e-6
+        inside = _polygon(np.pad(probe, ((0, 0), (0, 1))), points, paths) < 0
+        normal[inside] *= -1
+        before = np.roll(normal, 1, axis=0)
+        out[idx] = a + delta * (before + normal) / (1 + np.sum(before * normal, axis=1))[:, None]
+    return out
+
+
+def _rigid(linear):
+    return np.allclose(linear.T @ linear, np.eye(3))
+
+
+def _exact(node, outside):
+    """whether node's distance is exact (outside it only, if outside)"""
+    if node.modifier or node.is_part_root or getattr(node, "body", None) is not None:
+        return False
+    if node.name in _EXACT:
+        return True
+    affine = _affine(node)
+    if affine is None and node.name not in _PASSTHROUGH:
+        return False
+    if affine is not None and not _rigid(affine[0]):
+        return False
+    kids = [c for c in node.children if not c.is_hole]
+    # the min of exact distances is exact outside all of them only
+    return bool(kids) and (outside or len(kids) == 1) and all(_exact(c, outside) for c in kids)
+
+
+def _extruded(d2, dz):
+    w = np.stack([d2, dz], axis=1)
+    return np.minimum(w.max(axis=1), 0) + np.linalg.norm(np.maximum(w, 0), axis=1)
+
+
+def _points(points):
+    p = np.asarray(points, dtype=float)
+    single = p.ndim == 1
+    p = np.atleast_2d(p)
+    if p.shape[1] == 2:
+        p = np.concatenate([p, np.zeros((len(p), 1))], axis=1)
+    if p.shape[1] != 3:
+        raise ValueError("points must be (N, 3) or (N, 2)")
+    return p, single
+
+
+def distance(obj, points):
+    """Signed distance from points (N, 3) to obj: negative inside.
+
+    Supports the primitives (cube, sphere, cylinder, square, circle, polygon),
+    translate / rotate / scale / mirror / multmatrix, union / difference /
+    intersection, holes, linear / rotate extrusions and the hulls of two
+    placements of one object that hull_chain, sweep and ** build.
+    offset(r) needs exact distances below it (primitives under rigid
+    transforms, unions of them when growing), offset(delta) a single 2d
+    primitive. Raises NotImplementedError for others (minkowski, polyhedron...).
+    """
+    p, single = _points(points)
+    d = _Evaluator().part(obj, p)
+    return d[0] if single else d
+
+
+def contains(obj, points, tolerance=0.0):
+    """Which points are inside obj (or within tolerance of it)"""
+    return distance(obj, points) <= tolerance
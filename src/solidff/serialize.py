@@ -0,0 +1,519 @@
+# compact binary storage of solid object trees
+#
+# Layout: a header (magic, byte order, length and array typecode of every
+# section), then the sections below, each padded to 8 bytes.
+# Integer sections use the narrowest typecode their values fit in.
+#
+# Nodes are stored children first, the root is the last node.
+# (class, name) pairs, parameter keys and values and whole parameter dicts
+# are interned, and subtrees that are shared in the tree (the same object
+# used twice) are stored once.
+#
+# Loading builds every node with C level loops (map / zip over the sections)
+# instead of a Python loop per node; all parameter dicts come out of one
+# marshal.loads call.
+import array
+import collections
+import contextlib
+import gc
+import importlib
+import itertools
+import marshal
+import mmap
+import pickle
+import struct
+import sys
+import traceback
+from solid.solidpython import IncludedOpenSCADObject
+
+MAGIC = b"SFF\x03"
+
+_SECTIONS = [
+    "strings",  # utf-8, raw bytes
+    "string_ends",
+    "kind_class",  # string index of 'module:qualname'
+    "kind_name",  # string index of the OpenSCAD name
+    "node_kind",
+    "node_flags",
+    "node_params",  # parameter dict index
+    "node_child_counts",
+    "children",  # node indices
+    "params_counts",
+    "params_keys",  # value indices
+    "params_values",  # value indices
+    "value_kinds",
+    "value_data",  # int, bool, index into floats, strings or item lists
+    "floats",
+    "item_counts",
+    "items",  # value indices
+    "extras",  # pickle, raw bytes
+]
+_RAW = {"strings", "extras"}
+_HEADER_FORMAT = f"<4sB3x{len(_SECTIONS)}Q{len(_SECTIONS)}s"
+# padded, so the sections stay 8 byte aligned for cast()
+_HEADER = struct.Struct(
+    _HEADER_FORMAT + f"{-struct.calcsize(_HEADER_FORMAT) % 8}x"
+)
+
+_MODIFIERS = ["", "*", "#", "%", "!"]
+_MODIFIER_INDEX = {m: i for i, m in enumerate(_MODIFIERS)}
+_HOLE, _PART_ROOT, _HAS_HOLE_CHILDREN, _EXTRAS = 1, 2, 4, 8
+_MODIFIER_SHIFT = 4
+
+_NONE, _BOOL, _INT, _FLOAT, _STR, _LIST, _TUPLE, _PICKLE = range(8)
+_INT_RANGE = (-(2**63), 2**63 - 1)
+
+# marshal format version 2 has no back references, so marshalled values
+# can be concatenated into a marshalled list
+_MARSHAL_VERSION = 2
+_MARSHAL_LIST = b"["
+
+# attributes every OpenSCADObject has; anything else goes to 'extras'
+_STANDARD_ATTRS = {
+    "name",
+    "params",
+    "children",
+    "modifier",
+    "parent",
+    "is_hole",
+    "has_hole_children",
+    "is_part_root",
+    "traits",
+    "ff_hash",  # derived, see interning
+}
+
+
+def _narrow(values):
+    """Pack ints into the smallest array typecode that holds them"""
+    lo = min(values, default=0)
+    hi = max(values, default=0)
+    signed = lo < 0
+    for code in ("b", "h", "i", "q") if signed else ("B", "H", "I", "Q"):
+        bits = 8 * array.array(code).itemsize - signed
+        if -(2**bits) <= lo and hi < 2**bits:
+            break
+    return array.array(code, values)
+
+
+class _Writer:
+    def __init__(self):
+        self.strings = {}
+        self.kinds = {}
+        self.values = {}
+        self.param_sets = {}
+        self.marshalled_params = {}  # fast path for param_sets
+        self.kind_keys = {}  # (class, name) -> kind index
+        self.nodes = {}  # id(node) -> index
+        self.sec = {name: [] for name in _SECTIONS}
+        self.extras = {}
+        self.keep_alive = []  # ids are only unique while the objects live
+
+    def string(self, s):
+        idx = self.strings.get(s)
+        if idx is None:
+            idx = self.strings[s] = len(self.strings)
+        return idx
+
+    def value(self, v):
+        t = type(v)
+        if v is None:
+            key = (_NONE,)
+        elif t is bool:
+            key = (_BOOL, v)
+        elif t is int and _INT_RANGE[0] <= v <= _INT_RANGE[1]:
+            key = (_INT, v)
+        elif t is float:
+            key = (_FLOAT, struct.pack("<d", v))  # keeps -0.0 / nan apart
+        elif t is str:
+            key = (_STR, v)
+        elif t is list or t is tuple:
+            key = (_LIST if t is list else _TUPLE, tuple(self.value(x) for x in v))
+        else:
+            self.keep_alive.append(v)
+            key = (_PICKLE, id(v))
+        idx = self.values.get(key)
+        if idx is not None:
+            return idx
+        kind = key[0]
+        sec = self.sec
+        if kind == _NONE:
+            data = 0
+        elif kind == _BOOL or kind == _INT:
+            data = int(v)
+        elif kind == _FLOAT:
+            data = len(sec["floats"])
+            sec["floats"].append(v)
+        elif kind == _STR:
+            data = self.string(v)
+        elif kind == _LIST or kind == _TUPLE:
+            data = len(sec["item_counts"])
+            sec["item_counts"].append(len(key[1]))
+            sec["items"].extend(key[1])
+        else:
+            # pickles share the string table; latin-1 round trips any bytes
+            pickled = pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)
+            data = self.string(pickled.decode("latin-1"))
+        idx = self.values[key] = len(sec["value_kinds"])
+        sec["value_kinds"].append(kind)
+        sec["value_data"].append(data)
+        return idx
+
+    def params(self, params):
+        # equal marshal bytes mean equal types and values - no need to
+        # look at the values one by one
+        try:
+            marshalled = marshal.dumps(params, _MARSHAL_VERSION)
+        except ValueError:
+            marshalled = None
+        else:
+            idx = self.marshalled_params.get(marshalled)
+            if idx is not None:
+                return idx
+        key = tuple((self.value(k), self.value(v)) for k, v in params.items())
+        idx = self.param_sets.get(key)
+        if idx is None:
+            sec = self.sec
+            idx = self.param_sets[key] = len(sec["params_counts"])
+            sec["params_counts"].append(len(key))
+            for k, v in key:
+                sec["params_keys"].append(k)
+                sec["params_values"].append(v)
+        if marshalled is not None:
+            self.marshalled_params[marshalled] = idx
+        return idx
+
+    def kind(self, node):
+        cls = type(node)
+        idx = self.kind_keys.get((cls, node.name))
+        if idx is None:
+            key = (_qualified(cls), node.name)
+            idx = self.kinds.get(key)
+            if idx is None:
+                idx = self.kinds[key] = len(self.kinds)
+                self.sec["kind_class"].append(self.string(key[0]))
+                self.sec["kind_name"].append(self.string(key[1]))
+            self.kind_keys[(cls, node.name)] = idx
+        return idx
+
+    def node(self, root):
+        sec = self.sec
+        nodes = self.nodes
+        kind_keys = self.kind_keys
+        node_kind = sec["node_kind"].append
+        node_flags = sec["node_flags"].append
+        node_params = sec["node_params"].append
+        node_child_counts = sec["node_child_counts"].append
+        children = sec["children"].extend
+        params = self.params
+        for node in self._post_order(root):
+            idx = nodes[id(node)] = len(nodes)
+            kind = kind_keys.get((type(node), node.name))
+            node_kind(self.kind(node) if kind is None else kind)
+            flags = (
+                (_HOLE if node.is_hole else 0)
+                | (_PART_ROOT if node.is_part_root else 0)
+                | (_HAS_HOLE_CHILDREN if node.has_hole_children else 0)
+                | (_MODIFIER_INDEX[node.modifier] << _MODIFIER_SHIFT)
+            )
+            if node.traits or node.__dict__.keys() - _STANDARD_ATTRS:
+                extras = {
+                    k: v for k, v in node.__dict__.items() if k not in _STANDARD_ATTRS
+                }
+                if node.traits:
+                    extras["traits"] = node.traits
+                self.extras[idx] = extras
+                flags |= _EXTRAS
+            node_flags(flags)
+            node_params(params(node.params))
+            node_child_counts(len(node.children))
+            children([nodes[id(c)] for c in node.children])
+        return nodes[id(root)]
+
+    def _post_order(self, root):
+        # iterative, trees can be deeper than the recursion limit.
+        # Nodes stay alive in the returned list, so their ids are unique.
+        seen = {id(root)}
+        order = []
+        stack = [(root, iter(root.children))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    stack.append((child, iter(child.children)))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+        return order
+
+    def to_bytes(self):
+        sec = self.sec
+        encoded = [s.encode("utf-8", "surrogatepass") for s in self.strings]
+        pos = 0
+        for e in encoded:
+            pos += len(e)
+            sec["string_ends"].append(pos)
+        sec["strings"] = b"".join(encoded)
+        sec["extras"] = (
+            pickle.dumps(self.extras, protocol=pickle.HIGHEST_PROTOCOL)
+            if self.extras
+            else b""
+        )
+        parts = []
+        lengths = []
+        codes = b""
+        for name in _SECTIONS:
+            if name in _RAW:
+                raw, code = sec[name], b"\x00"
+            else:
+                a = array.array("d", sec[name]) if name == "floats" else _narrow(sec[name])
+                raw, code = a.tobytes(), a.typecode.encode("ascii")
+            lengths.append(len(raw))
+            codes += code
+            parts.append(raw + b"\x00" * (-len(raw) % 8))
+        byteorder = 0 if sys.byteorder == "little" else 1
+        return _HEADER.pack(MAGIC, byteorder, *lengths, codes) + b"".join(parts)
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    # the cycle collector would otherwise rescan the growing tables and
+    # trees (parent <-> children cycles) over and over - nothing we create
+    # here is garbage
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def dumps(root):
+    """Serialize a solid object tree to bytes, see save"""
+    with _gc_paused():
+        w = _Writer()
+        w.node(root)
+        return w.to_bytes()
+
+
+def save(root, path):
+    """Write root to path in solidff's compact binary format.
+
+    Shared subtrees are stored once and shared again after load.
+    Parameter values that are not None, bool, int, float, str or
+    lists/tuples of those are pickled.
+    """
+    with open(path, "wb") as op:
+        op.write(dumps(root))
+
+
+def _sections(buf):
+    if len(buf) < _HEADER.size:
+        raise ValueError("not a solidff binary file")
+    magic, byteorder, *rest = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("not a solidff binary file")
+    lengths, codes = rest[:-1], rest[-1].decode("ascii", "replace")
+    if _HEADER.size + sum(n + (-n % 8) for n in lengths) > len(buf):
+        raise ValueError("not a solidff binary file (truncated)")
+    swap = byteorder != (0 if sys.byteorder == "little" else 1)
+    out = {}
+    pos = _HEADER.size
+    view = memoryview(buf)
+    for name, length, code in zip(_SECTIONS, lengths, codes):
+        raw = view[pos : pos + length]
+        if name in _RAW:
+            out[name] = raw
+        else:
+            try:
+                if swap:
+                    out[name] = array.array(code, raw)
+                    out[name].byteswap()
+                else:
+                    # zero copy view into the (mapped) buffer
+                    out[name] = raw.cast(code)
+            except (TypeError, ValueError):
+                raise ValueError("not a solidff binary file") from None
+        pos += length + (-length % 8)
+    return out
+
+
+def _qualified(cls):
+    """how a node class is written: 'module:qualname'. Classes that can't be
+    imported by that name - solid.import_scad makes them on the fly - are
+    written as IncludedOpenSCADObject, whose instances carry their
+    include_string along (in extras)"""
+    qualified = f"{cls.__module__}:{cls.__qualname__}"
+    try:
+        if _resolve(qualified) is cls:
+            return qualified
+    except (ImportError, AttributeError):
+        pass
+    if issubclass(cls, IncludedOpenSCADObject):
+        return f"{IncludedOpenSCADObject.__module__}:IncludedOpenSCADObject"
+    raise ValueError(f"can't save {cls.__qualname__} nodes: the class can't be imported by name")
+
+
+def _resolve(qualified):
+    module, _, qualname = qualified.partition(":")
+    cls = importlib.import_module(module)
+    for part in qualname.split("."):
+        cls = getattr(cls, part)
+    return cls
+
+
+def loads(buf):
+    """Rebuild a tree from bytes (or anything supporting the buffer protocol)"""
+    with _gc_paused():
+        return _loads(buf)
+
+
+def _loads(buf):
+    sec = _sections(buf)
+    blob = bytes(sec["strings"])
+    strings = []
+    start = 0
+    for end in sec["string_ends"]:
+        strings.append(blob[start:end].decode("utf-8", "surrogatepass"))
+        start = end
+
+    floats = sec["floats"]
+    items = sec["items"].tolist()
+    item_starts = [0]
+    for n in sec["item_counts"]:
+        item_starts.append(item_starts[-1] + n)
+    values = []
+    for kind, data in zip(sec["value_kinds"], sec["value_data"]):
+        if kind == _NONE:
+            v = None
+        elif kind == _BOOL:
+            v = bool(data)
+        elif kind == _INT:
+            v = data
+        elif kind == _FLOAT:
+            v = floats[data]
+        elif kind == _STR:
+            v = strings[data]
+        elif kind == _LIST or kind == _TUPLE:
+            # items always refer to earlier values
+            v = [values[i] for i in items[item_starts[data] : item_starts[data + 1]]]
+            if kind == _TUPLE:
+                v = tuple(v)
+        else:
+            v = pickle.loads(strings[data].encode("latin-1"))
+        values.append(v)
+
+    # every distinct parameter dict is marshalled once, and one marshal.loads
+    # of their concatenation gives every node a fresh copy, nested lists
+    # included. Dicts holding values marshal can't handle (pickled ones) are
+    # copied per node afterwards.
+    params_keys = sec["params_keys"].tolist()
+    params_values = sec["params_values"].tolist()
+    param_blobs = []
+    unmarshallable = {}
+    pos = 0
+    for n in sec["params_counts"]:
+        params = {
+            values[k]: values[v]
+            for k, v in zip(params_keys[pos : pos + n], params_values[pos : pos + n])
+        }
+        pos += n
+        try:
+            param_blobs.append(marshal.dumps(params, _MARSHAL_VERSION))
+        except ValueError:
+            unmarshallable[len(param_blobs)] = params
+            param_blobs.append(marshal.dumps(None, _MARSHAL_VERSION))
+
+    node_params = sec["node_params"].tolist()
+    count = len(node_params)
+    all_params = marshal.loads(
+        _MARSHAL_LIST
+        + struct.pack("<i", count)
+        + b"".join(map(param_blobs.__getitem__, node_params))
+    )
+    if unmarshallable:
+        for i, param_idx in enumerate(node_params):
+            if param_idx in unmarshallable:
+                all_params[i] = {
+                    k: _copy_lists(v) for k, v in unmarshallable[param_idx].items()
+                }
+
+    kinds = [
+        (_resolve(strings[c]), strings[n])
+        for c, n in zip(sec["kind_class"], sec["kind_name"])
+    ]
+    classes = [cls for cls, _ in kinds]
+    node_kind = sec["node_kind"].tolist()
+    node_flags = sec["node_flags"].tolist()
+    nodes = list(map(object.__new__, map(classes.__getitem__, node_kind)))
+
+    # child lists: slices of the flat children array
+    child_counts = sec["node_child_counts"].tolist()
+    ends = list(itertools.accumulate(child_counts))
+    flat = list(map(nodes.__getitem__, sec["children"].tolist()))
+    kids = list(map(flat.__getitem__, map(slice, [0] + ends[:-1], ends)))
+
+    # the attributes given by (kind, flags), shared by many nodes
+    heads = {
+        (kind, flags): (
+            kinds[kind][1],
+            _MODIFIERS[flags >> _MODIFIER_SHIFT],
+            bool(flags & _HOLE),
+            bool(flags & _HAS_HOLE_CHILDREN),
+            bool(flags & _PART_ROOT),
+        )
+        for kind, flags in set(zip(node_kind, node_flags))
+    }
+    # a dict display is the fastest way to build the attribute dicts
+    for node, (name, modifier, is_hole, has_hole_children, is_part_root), p, k in zip(
+        nodes, map(heads.__getitem__, zip(node_kind, node_flags)), all_params, kids
+    ):
+        node.__dict__ = {
+            "name": name,
+            "params": p,
+            "children": k,
+            "modifier": modifier,
+            "parent": None,
+            "is_hole": is_hole,
+            "has_hole_children": has_hole_children,
+            "is_part_root": is_part_root,
+            "traits": {},
+        }
+    # in node order, so shared nodes end up pointing at their last parent
+    parents = itertools.chain.from_iterable(map(itertools.repeat, nodes, child_counts))
+    _consume(map(setattr, flat, itertools.repeat("parent"), parents))
+
+    if len(sec["extras"]):
+        for i, extra in pickle.loads(bytes(sec["extras"])).items():
+            nodes[i].__dict__.update(extra)
+    return nodes[-1] if nodes else None
+
+
+def _consume(iterator):
+    collections.deque(iterator, maxlen=0)
+
+
+def _copy_lists(v):
+    if type(v) is list:
+        return [_copy_lists(x) for x in v]
+    if type(v) is tuple:
+        return tuple(_copy_lists(x) for x in v)
+    return v
+
+
+def load(path):
+    """Load a tree written by save. The file is memory mapped while decoding"""
+    with open(path, "rb") as op:
+        with mmap.mmap(op.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                return loads(view)
+            except BaseException as e:
+                # the failed frames still hold views into the map - drop
+                # them so the map can close and the real error comes through
+                traceback.clear_frames(e.__traceback__)
+                raise
+            finally:
+                view.release()
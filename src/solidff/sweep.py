@@ -0,0 +1,111 @@
+# chains of pairwise hulls along a path, with the hulled object defined once
+import copy
+import solid
+from solid.solidpython import IncludedOpenSCADObject, _find_include_strings, indent
+from . import objects
+import hashlib
+
+
+class Module(objects.FFMixin, IncludedOpenSCADObject):
+    """Places OpenSCAD module `name()`, defined as body.
+
+    The definition goes out like a `use` line: solid writes it once at the top
+    of every file placing the module, together with the body's own includes,
+    no matter how often it's placed. The body is rendered as a tree of its
+    own, so holes in it are subtracted inside the module.
+    Place it again with call() (or just reuse the node).
+    """
+
+    def __init__(self, body, name=None):
+        # a parentless copy renders as a root, whatever body.parent is
+        root = copy.copy(body)
+        root.parent = None
+        code = root._render()
+        if name is None:
+            digest = hashlib.sha1(code.encode("utf-8")).hexdigest()[:12]
+            name = f"ff_module_{digest}"
+        solid.OpenSCADObject.__init__(self, name, {})
+        self.body = body
+        self.include_string = (
+            "".join(sorted(_find_include_strings(body)))
+            + f"module {name}() {{"
+            + indent(code)
+            + "\n}\n"
+        )
+
+    def call(self):
+        other = object.__new__(type(self))
+        solid.OpenSCADObject.__init__(other, self.name, {})
+        other.body = self.body
+        other.include_string = self.include_string
+        return other
+
+
+def _path(path):
+    import numpy as np
+
+    path = np.asarray(path, dtype=float)
+    if path.ndim != 2 or path.shape[1] != 3:
+        raise ValueError("path must be an (N, 3) array")
+    if len(path) < 2:
+        raise ValueError("path needs at least 2 points")
+    if not np.isfinite(path).all():
+        raise ValueError("path has non finite points")
+    repeated = np.flatnonzero((path[1:] == path[:-1]).all(axis=1))
+    if len(repeated):
+        raise ValueError(f"path has repeated points (at index {repeated[0] + 1})")
+    return path
+
+
+def _chain(obj, place, placements):
+    module = Module(obj)
+    # each placement is shared by the hulls on both sides of it
+    placed = [place(p)(module) for p in placements.tolist()]
+    hulls = [objects.hull()(a, b) for a, b in zip(placed, placed[1:])]
+    return objects.union()(*hulls)
+
+
+def hull_chain(obj, path):
+    """union of hull(obj at path[i], obj at path[i+1]) - a 'swept' obj.
+
+    Unlike nested hulls this keeps concave bends, and obj is rendered only once.
+    """
+    # plain translations render a lot shorter than 4x4 matrices
+    return _chain(obj, objects.translate, _path(path))
+
+
+def sweep(profile, path, thickness=0.01):
+    """Sweep a 2d profile along path, as a hull_chain of thin slices.
+
+    The profile's xy plane is turned to face along the path at every point,
+    with its origin on the path. Consecutive hulls are convex, so the profile's
+    concavities are filled in - sweep convex profiles or combine several.
+    """
+    import numpy as np
+
+    path = _path(path)
+    tangents = np.gradient(path, axis=0)
+    lengths = np.linalg.norm(tangents, axis=1, keepdims=True)
+    if not (lengths > 0).all():
+        # going straight back: the slice there would face nowhere
+        raise ValueError(f"path turns back on itself at index {np.flatnonzero(lengths == 0)[0]}")
+    tangents /= lengths
+
+    # rotation taking z to each tangent (Rodrigues, vectorized)
+    x, y, z = tangents.T
+    k = np.stack([-y, x, np.zeros_like(x)], axis=1)  # z cross t
+    cross = np.zeros((len(path), 3, 3))
+    cross[:, 0, 2], cross[:, 1, 2] = k[:, 1], -k[:, 0]
+    cross[:, 2, 0], cross[:, 2, 1] = -k[:, 1], k[:, 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = np.where(z > -1 + 1e-12, 1 / (1 + z), 0)
+    rot = np.eye(3) + cross + (cross @ cross) * factor[:, None, None]
+    # tangent pointing down -z: turn around x instead
+    rot[z <= -1 + 1e-12] = np.diag([1.0, -1.0, -1.0])
+
+    m = np.zeros((len(path), 4, 4))
+    m[:, :3, :3] = rot
+    m[:, :3, 3] = path
+    m[:, 3, 3] = 1
+    slice_ = objects.linear_extrude(height=thickness, center=True)(profile)
+    return _chain(slice_, lambda m: objects.multmatrix(m=m), m)
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from solidff import q, acompile, adump
+from solidff import aio
+
+# stands in for openscad: stub [--fail|--hang] [--sleep s] --log fn -o out in.scad
+STUB = """
+import os, shutil, sys, time
+args = sys.argv[1:]
+log = args[args.index("--log") + 1]
+with open(log, "a") as op:
+    op.write(f"start {os.getpid()} {time.time()}\\n")
+if "--fail" in args:
+    sys.stderr.write("boom")
+    sys.exit(3)
+if "--hang" in args:
+    time.sleep(60)
+if "--sleep" in args:
+    time.sleep(float(args[args.index("--sleep") + 1]))
+shutil.copy(args[-1], args[args.index("-o") + 1])
+with open(log, "a") as op:
+    op.write(f"end {os.getpid()} {time.time()}\\n")
+"""
+
+
+@pytest.fixture
+def openscad(tmp_path):
+    fn = tmp_path / "openscad"
+    fn.write_text(f"#!{sys.executable}\n" + STUB)
+    fn.chmod(0o755)
+    return str(fn)
+
+
+@pytest.fixture
+def concurrency():
+    old = aio._max_concurrency
+    yield aio.set_concurrency
+    aio.set_concurrency(old)
+
+
+def _events(log):
+    out = []
+    for line in log.read_text().splitlines():
+        what, pid, t = line.split()
+        out.append((float(t), what, int(pid)))
+    return sorted(out)
+
+
+def _max_running(log):
+    running = most = 0
+    for _, what, _ in _events(log):
+        running += 1 if what == "start" else -1
+        most = max(most, running)
+    return most
+
+
+def test_acompile(tmp_path, openscad):
+    log = tmp_path / "log"
+
+    async def main():
+        return await acompile(
+            q(1), tmp_path / "a.stl", openscad=openscad, args=("--log", str(log))
+        )
+
+    assert asyncio.run(main()) == (b"", b"")
+    assert (tmp_path / "a.stl").read_text() == (tmp_path / "a.scad").read_text()
+    assert "cube" in (tmp_path / "a.stl").read_text()
+
+
+def test_failure_raises(tmp_path, openscad):
+    log = tmp_path / "log"
+
+    async def main():
+        await acompile(
+            q(1), tmp_path / "a.stl", openscad=openscad, args=("--fail", "--log", str(log))
+        )
+
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        asyncio.run(main())
+    assert e.value.returncode == 3
+    assert e.value.stderr == b"boom"
+
+
+def test_timeout_kills_openscad(tmp_path, openscad):
+    log = tmp_path / "log"
+
+    async def main():
+        await acompile(
+            q(1),
+            tmp_path / "a.stl",
+            openscad=openscad,
+            args=("--hang", "--log", str(log)),
+            timeout=2,
+        )
+
+    start = time.time()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(main())
+    assert time.time() - start < 10
+    ((_, _, pid),) = _events(log)
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
+
+
+def test_concurrency_limit(tmp_path, openscad, concurrency):
+    log = tmp_path / "log"
+
+    def jobs(n, prefix):
+        return [
+            acompile(
+                q(1),
+                tmp_path / f"{prefix}{i}.stl",
+                openscad=openscad,
+                args=("--sleep", "0.5", "--log", str(log)),
+            )
+            for i in range(n)
+        ]
+
+    async def main():
+        concurrency(2)
+        await asyncio.gather(*jobs(6, "a"))
+        first = _max_running(log)
+        log.unlink()
+        # a new limit applies to the running loop too
+        concurrency(3)
+        await asyncio.gather(*jobs(6, "b"))
+        return first, _max_running(log)
+
+    assert asyncio.run(main()) == (2, 3)
+
+
+def test_adump(tmp_path, concurrency):
+    concurrency(2)
+
+    async def main():
+        await asyncio.gather(*[adump(q(i + 1), str(tmp_path / f"{i}.scad")) for i in range(5)])
+
+    asyncio.run(main())
+    assert "cube(size = [3, 3, 3])" in (tmp_path / "2.scad").read_text()
@@ -0,0 +1,87 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import solid
+import solidff
+from solidff import q, cy, get_config, set_config, configure
+
+
+def test_configure_restores_the_previous_settings():
+    before = get_config()
+    with configure(segments=12, split=True) as config:
+        assert config.segments == 12 and get_config().split
+        with configure(segments=7):
+            assert get_config() == config._replace(segments=7)
+        assert get_config() == config
+    assert get_config() == before
+
+
+def test_configure_restores_after_errors():
+    before = get_config()
+    with pytest.raises(KeyError):
+        with configure(segments=5):
+            raise KeyError()
+    assert get_config() == before
+
+
+def test_threads_keep_their_own_settings():
+    barrier = threading.Barrier(4)
+
+    def work(segments):
+        with configure(segments=segments):
+            barrier.wait()  # all of them configured at the same time
+            return [cy(2, 3).params["segments"] for _ in range(50)]
+
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(work, [8, 16, 32, 64]))
+    assert [set(r) for r in results] == [{8}, {16}, {32}, {64}]
+
+
+def test_set_config_doesnt_leak_into_new_threads():
+    def work():
+        set_config(segments=3)
+        return get_config().segments
+
+    before = get_config()
+    with ThreadPoolExecutor(1) as pool:
+        assert pool.submit(work).result() == 3
+    assert get_config() == before
+
+
+@pytest.fixture
+def unpatched():
+    solidff.unpatch()
+    try:
+        yield
+    finally:
+        solidff.patch()
+
+
+def _part():
+    return (q(1).x(1) + cy(2, 3).rzx() - q(2).h()).rz(30).c("red")
+
+
+def test_unpatch_leaves_solid_alone_and_solidff_objects_working(unpatched):
+    for name in ("x", "h", "rzx", "e", "distance", "__pow__"):
+        assert not hasattr(solid.OpenSCADObject, name)
+    assert not hasattr(solid.cube(1), "x")
+    code = solid.scad_render(_part())
+    solidff.patch()
+    assert solid.scad_render(_part()) == code
+    assert solid.cube(1).x(2).params["v"] == (2, 0, 0)
+
+
+def test_patch_restores_what_was_there_before(unpatched):
+    def mine(self):
+        return "mine"
+
+    solid.OpenSCADObject.rz = mine
+    try:
+        solidff.patch()
+        assert solid.cube(1).rz(5).name == "rotate"
+        solidff.unpatch()
+        assert solid.OpenSCADObject.rz is mine
+        assert not hasattr(solid.OpenSCADObject, "rzx")
+    finally:
+        del solid.OpenSCADObject.rz
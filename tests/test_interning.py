@@ -0,0 +1,54 @@
+import solid
+from solidff import q, cy, b, configure, structural_hash, thaw
+from solidff.interning import is_interned
+
+
+def test_identical_calls_share_nodes():
+    with configure(immutable=True):
+        assert cy(d=3, h=10) is cy(d=3, h=10)
+        assert q(1).x(2) is q(1).x(2)
+        assert cy(d=3, h=10) is not cy(d=3, h=11)
+        assert q(1) is not q(1.0)
+
+
+def test_operators_are_interned():
+    with configure(immutable=True):
+        a = q(1) + cy(1, 2)
+        assert is_interned(a)
+        assert a is q(1) + cy(1, 2)
+        assert (q(2) - b(1)) is (q(2) - b(1))
+        assert (q(2) * b(1)) is (q(2) * b(1))
+        assert sum([q(1), b(2)]) is sum([q(1), b(2)])
+        # and so is everything built on top of them
+        part = (q(1) + cy(1, 2)).x(5).rz(10)
+        assert is_interned(part)
+        assert part is (q(1) + cy(1, 2)).x(5).rz(10)
+
+
+def test_extending_does_not_modify_shared_nodes():
+    with configure(immutable=True):
+        a = q(1) + q(2)
+        before = solid.scad_render(a)
+        c = a + q(3)
+        assert len(c.children) == 3
+        assert solid.scad_render(a) == before
+
+
+def test_holes_are_not_interned():
+    with configure(immutable=True):
+        h = cy(1, 5).h()
+        assert not is_interned(h)
+        assert not is_interned(q(3) + h)
+
+
+def test_mutable_by_default():
+    assert q(1) is not q(1)
+    assert not is_interned(q(1) + q(2))
+
+
+def test_structural_hash_matches_interned_hash():
+    with configure(immutable=True):
+        shared = (q(1) + cy(1, 2)).x(3)
+    plain = (q(1) + cy(1, 2)).x(3)
+    assert structural_hash(plain) == shared.ff_hash
+    assert not is_interned(thaw(shared))
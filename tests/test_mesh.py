@@ -0,0 +1,140 @@
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+from solidff import mesh
+
+
+def _grid(n, axis, side, size):
+    """one side of a box as triangles, n x n squares, facing outwards"""
+    u, v = (axis + 1) % 3, (axis + 2) % 3
+    out = []
+    steps = np.linspace(0, size, n + 1)
+    for i in range(n):
+        for j in range(n):
+            corners = []
+            for du, dv in ((0, 0), (1, 0), (1, 1), (0, 1)):
+                p = np.zeros(3)
+                p[axis] = size if side else 0
+                p[u], p[v] = steps[i + du], steps[j + dv]
+                corners.append(p)
+            a, b, c, d = corners
+            if side:
+                out += [(a, b, c), (a, c, d)]
+            else:
+                out += [(a, c, b), (a, d, c)]
+    return out
+
+
+def box(n=4, size=2.0):
+    return np.array([t for axis in range(3) for side in (0, 1) for t in _grid(n, axis, side, size)])
+
+
+def volume(vertices, faces):
+    v = vertices[faces]
+    return np.einsum("ij,ij->i", v[:, 0], np.cross(v[:, 1], v[:, 2])).sum() / 6
+
+
+def watertight(faces):
+    _, counts = mesh._edge_counts(faces)
+    return bool((counts == 2).all())
+
+
+ASCII = """solid t
+facet normal 0 0 -1
+ outer loop
+  vertex 0 0 0
+  vertex 0 1 0
+  vertex 1 0 0
+ endloop
+endfacet
+facet normal 0 0 1
+ outer loop
+  vertex 0 0 1.5e0
+  vertex 1 0 1.5
+  vertex 0 1 1.5
+ endloop
+endfacet
+endsolid t
+"""
+
+
+def test_read_ascii_stl(tmp_path):
+    fn = tmp_path / "t.stl"
+    fn.write_text(ASCII)
+    triangles = mesh.read_stl(fn)
+    assert triangles.shape == (2, 3, 3)
+    assert triangles[1, 0].tolist() == [0, 0, 1.5]
+
+
+def test_binary_stl_round_trip(tmp_path):
+    vertices, faces = mesh.weld(box())
+    fn = tmp_path / "t.stl"
+    mesh.write_stl(fn, vertices, faces)
+    assert fn.stat().st_size == 84 + 50 * len(faces)
+    again, again_faces = mesh.weld(mesh.read_stl(fn))
+    assert len(again) == len(vertices)
+    assert np.allclose(again[again_faces], vertices[faces])
+
+
+def test_weld_merges_vertices_and_drops_degenerate_faces():
+    triangles = np.array(
+        [
+            [[0, 0, 0], [1, 0, 0], [0, 1, 0]],
+            [[1, 0, 0], [1, 1, 0], [0, 1 + 1e-9, 0]],  # shares an edge, within tolerance
+            [[0, 0, 0], [1, 0, 0], [1, 0, 0]],  # degenerate
+        ],
+        dtype=float,
+    )
+    vertices, faces = mesh.weld(triangles)
+    assert len(vertices) == 4
+    assert len(faces) == 2
+    assert watertight(mesh.weld(box(3))[1])
+
+
+def test_decimate_keeps_volume_creases_and_watertightness():
+    vertices, faces = mesh.weld(box(6, 2.0))
+    small_vertices, small_faces = mesh.decimate(vertices, faces)
+    # every side down to a fan over its 4 * 6 edge vertices
+    assert len(small_faces) == 6 * (4 * 6 - 2)
+    assert watertight(small_faces)
+    assert volume(small_vertices, small_faces) == pytest.approx(8)
+    # only vertices on the box's edges are left, all 8 corners among them
+    on_bounds = np.isclose(small_vertices, 0) | np.isclose(small_vertices, 2)
+    assert (on_bounds.sum(axis=1) >= 2).all()
+    assert (on_bounds.sum(axis=1) == 3).sum() == 8
+
+
+def test_decimate_keeps_borders():
+    vertices, faces = mesh.weld(np.array(_grid(6, 2, 1, 1.0)))
+    border = (np.isclose(vertices[:, :2], 0) | np.isclose(vertices[:, :2], 1)).any(axis=1)
+    small_vertices, small_faces = mesh.decimate(vertices, faces)
+    assert len(small_faces) < len(faces)
+    kept = {tuple(v) for v in small_vertices.round(9).tolist()}
+    assert {tuple(v) for v in vertices[border].round(9).tolist()} <= kept
+
+
+def test_write_3mf(tmp_path):
+    vertices, faces = mesh.weld(box(2))
+    fn = tmp_path / "t.3mf"
+    mesh.write_3mf(fn, vertices, faces)
+    with zipfile.ZipFile(fn) as z:
+        assert z.testzip() is None
+        assert set(z.namelist()) == {"[Content_Types].xml", "_rels/.rels", "3D/3dmodel.model"}
+        model = ET.fromstring(z.read("3D/3dmodel.model"))
+    ns = {"m": "http://schemas.microsoft.com/3dmanufacturing/core/2015/02"}
+    assert len(model.findall(".//m:vertex", ns)) == len(vertices)
+    assert len(model.findall(".//m:triangle", ns)) == len(faces)
+
+
+def test_compress_overwrites_its_input(tmp_path):
+    fn = tmp_path / "t.stl"
+    fn.write_text(ASCII)
+    assert mesh.compress(fn) == 2
+    assert fn.stat().st_size == 84 + 50 * 2
+    triangles = mesh.read_stl(fn)
+    assert triangles.shape == (2, 3, 3)
+    assert sorted(triangles.reshape(-1, 3).tolist()) == sorted(
+        [[0, 0, 0], [0, 1, 0], [1, 0, 0], [0, 0, 1.5], [1, 0, 1.5], [0, 1, 1.5]]
+    )
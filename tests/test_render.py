@@ -0,0 +1,98 @@
+import re
+from pathlib import Path
+
+import solid
+from solidff import q, cy, dump, scad_render_split
+
+
+def assembly():
+    # fragments inside fragments: parts of ~12 nodes, groups of ~60
+    groups = []
+    for g in range(3):
+        parts = [(q(1 + i, 2, 3) + cy(1, 5)).x(i).rz(g * 10 + i) for i in range(5)]
+        groups.append(solid.union()(*parts).y(g * 20))
+    return solid.union()(*groups)
+
+
+def _uses(fn):
+    return re.findall(r"^use <(.*)>$", Path(fn).read_text(), re.M)
+
+
+def _inline(fn):
+    """the file with every used fragment's module body pasted in place of its call"""
+    text = Path(fn).read_text()
+    for used in _uses(fn):
+        path = Path(fn).parent / used
+        name = path.stem
+        body = re.search(
+            r"module %s\(\) \{(.*)\n\}\n$" % name, _inline(path), re.S
+        ).group(1)
+        text = text.replace("use <%s>\n" % used, "")
+        text = text.replace("%s();" % name, body)
+    return text
+
+
+def test_split_uses_resolve_relative_to_the_using_file(tmp_path):
+    fn = tmp_path / "t.scad"
+    dump(assembly(), str(fn), split=True, min_nodes=10)
+    files = [fn] + sorted((tmp_path / "t_fragments").glob("*.scad"))
+    nested = 0
+    for f in files:
+        for used in _uses(f):
+            assert (f.parent / used).exists(), (f, used)
+            nested += f != fn
+    assert nested  # the test tree has fragments using fragments
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_split_is_the_same_code(tmp_path):
+    root = assembly()
+    fn = tmp_path / "t.scad"
+    dump(root, str(fn), split=True, min_nodes=10)
+    plain = solid.scad_render(root)
+    # up to indentation
+    squash = lambda s: re.sub(r"\s+", " ", s).strip()
+    assert squash(_inline(fn)) == squash(plain)
+
+
+def test_split_rewrites_only_changed_fragments(tmp_path):
+    root = assembly()
+    fn = str(tmp_path / "t.scad")
+    scad_render_split(root, fn, min_nodes=10)
+    frag_dir = tmp_path / "t_fragments"
+    before = {f.name: f.stat().st_mtime_ns for f in frag_dir.iterdir()}
+    root.children[1].children[0].children[2].params["a"] = 45
+    scad_render_split(root, fn, min_nodes=10, prune=False)
+    after = {f.name: f.stat().st_mtime_ns for f in frag_dir.iterdir()}
+    assert all(after[name] == mtime for name, mtime in before.items())
+    assert len(after) > len(before)
+
+
+def _used_fragments(fn):
+    """every fragment file fn uses, directly or through other fragments"""
+    found = set()
+    todo = [Path(fn)]
+    while todo:
+        f = todo.pop()
+        for used in _uses(f):
+            path = (f.parent / used).resolve()
+            if path not in found:
+                found.add(path)
+                todo.append(path)
+    return found
+
+
+def test_unused_fragments_are_removed(tmp_path):
+    root = assembly()
+    fn = str(tmp_path / "t.scad")
+    frag_dir = tmp_path / "t_fragments"
+    frag_dir.mkdir()
+    (frag_dir / "notes.txt").write_text("not ours")
+    for angle in (45, 46, 47):
+        root.children[1].children[0].children[2].params["a"] = angle
+        dump(root, fn, split=True, min_nodes=10)
+        assert {f.resolve() for f in frag_dir.glob("frag_*.scad")} == _used_fragments(fn)
+    assert (frag_dir / "notes.txt").exists()
+    root.children[1].children[0].children[2].params["a"] = 48
+    Path(fn).write_text(scad_render_split(root, fn, min_nodes=10))
+    assert {f.resolve() for f in frag_dir.glob("frag_*.scad")} == _used_fragments(fn)
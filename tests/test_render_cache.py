@@ -0,0 +1,140 @@
+import copy
+import random
+import threading
+
+import pytest
+import solid
+import solid.solidpython
+from solidff import q, cy, configure, dump
+from solidff import render
+from solidff.render import RenderCache
+
+
+def _find_hole_children(self, path=None):
+    # solid's, minus a bug: it forgets to pop part roots off the path, so their
+    # ancestors end up as empty blocks in the holes section. RenderCache doesn't.
+    path = path if path else [self]
+    hole_kids = []
+    for child in self.children:
+        path.append(child)
+        if child.is_hole:
+            hole_kids.append(child)
+            for p in path:
+                p.has_hole_children = True
+        elif not child.is_part_root:
+            hole_kids += child.find_hole_children(path)
+        path.pop()
+    return hole_kids
+
+
+@pytest.fixture
+def fixed_solid(monkeypatch):
+    monkeypatch.setattr(solid.OpenSCADObject, "find_hole_children", _find_hole_children)
+
+
+def _random_tree(rng, depth):
+    if depth == 0 or rng.random() < 0.2:
+        node = rng.choice(
+            [
+                lambda: solid.cube(rng.randint(1, 3)),
+                lambda: solid.sphere(rng.choice([1, 1.5, 2])),
+                lambda: solid.cylinder(r=1, h=rng.randint(1, 2), segments=rng.choice([None, 8])),
+            ]
+        )()
+    else:
+        op = rng.choice(
+            [
+                solid.union,
+                solid.difference,
+                solid.intersection,
+                solid.part,
+                lambda: solid.translate([rng.randint(-2, 2), 0, 0]),
+                lambda: solid.rotate(rng.choice([0, 90])),
+                lambda: solid.color("red"),
+            ]
+        )
+        node = op()(*[_random_tree(rng, depth - 1) for _ in range(rng.randint(1, 3))])
+        if rng.random() < 0.05:
+            node.set_modifier("#")
+    if rng.random() < 0.1:
+        node = solid.hole()(node)
+    return node
+
+
+def test_same_as_solid_on_random_trees(fixed_solid):
+    cache = RenderCache()
+    for seed in range(200):
+        rng = random.Random(seed)
+        tree = _random_tree(rng, 5)
+        # solid sets flags while rendering, give it a copy
+        assert cache.render(tree) == solid.scad_render(copy.deepcopy(tree)), seed
+        leaf = tree
+        while leaf.children:
+            leaf = rng.choice(leaf.children)
+        leaf.params["h" if "h" in leaf.params else "size" if "size" in leaf.params else "r"] = 7
+        assert cache.render(tree) == solid.scad_render(copy.deepcopy(tree)), seed
+
+
+def test_values_with_equal_hashes_dont_collide():
+    assert hash(-1) == hash(-2)
+    cache = RenderCache()
+    assert "h = -1" in cache.render(solid.cylinder(d=3, h=-1))
+    assert "h = -2" in cache.render(solid.cylinder(d=3, h=-2))
+    assert "[-0.0000000000, 0, 0]" in cache.render(solid.translate([-0.0, 0, 0])(solid.cube(1)))
+    assert "[0.0000000000, 0, 0]" in cache.render(solid.translate([0.0, 0, 0])(solid.cube(1)))
+    with configure(immutable=True):
+        assert "[-1, 0, 0]" in cache.render(q(10).x(-1))
+        assert "[-2, 0, 0]" in cache.render(q(10).x(-2))
+        assert "1.0" in cache.render(q(1.0))
+        assert "1.0" not in cache.render(q(1))
+
+
+def test_bounded_and_disabled():
+    tree = solid.union()(*[q(i).x(i) for i in range(50)])
+    expected = solid.scad_render(tree)
+    cache = RenderCache(max_chars=500)
+    assert cache.render(tree) == expected
+    assert cache._size <= 500
+    assert cache.render(tree) == expected
+    cache = RenderCache(max_chars=0)
+    assert cache.render(tree) == expected
+    assert not cache._entries
+
+
+def test_threads():
+    trees = [solid.union()(*[(q(i + j) + cy(2, 4)).x(i) for i in range(20)]) for j in range(8)]
+    expected = [solid.scad_render(t) for t in trees]
+    cache = RenderCache(max_chars=20000)
+    errors = []
+
+    def work(offset):
+        for k in range(40):
+            i = (k + offset) % len(trees)
+            if cache.render(trees[i]) != expected[i]:
+                errors.append(i)
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert cache._size == sum(e.size for e in cache._entries.values()) <= 20000
+
+
+def test_dump_caches_only_when_asked(tmp_path):
+    fn = str(tmp_path / "t.scad")
+    tree = solid.union()(q(1), cy(2, 3))
+    render.clear_cache()
+    dump(tree, fn)
+    assert not render._cache._entries
+    with configure(cache=True):
+        dump(tree, fn)
+    assert render._cache._entries
+    render.clear_cache()
+    with configure(immutable=True):
+        dump(q(1) + cy(2, 3), fn)
+    assert render._cache._entries
+    render.clear_cache()
+    dump(tree, fn, split=True, min_nodes=2)
+    assert not render._cache._entries
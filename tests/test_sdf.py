@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+import solid
+from solidff import q, cy, c, b, s, hull_chain, sweep, Module
+from solidff.sdf import distance, contains
+
+
+def test_primitives():
+    assert distance(q(2), [1, 1, 3]) == pytest.approx(1)
+    assert distance(q(2, center=True), [0, 0, 0]) == pytest.approx(-1)
+    assert distance(b(2), [0, 0, 3]) == pytest.approx(2)
+    assert distance(cy(d=2, h=4), [3, 0, 2]) == pytest.approx(2)
+    assert distance(cy(d=2, h=4), [0, 0, 6]) == pytest.approx(2)
+    assert list(contains(s(4), [[1, 1], [5, 1]])) == [True, False]
+    assert distance(c(d=4), [[3, 0]]) == pytest.approx([1])
+    triangle = solid.polygon([[0, 0], [4, 0], [0, 4]])
+    assert list(contains(triangle, [[1, 1], [3, 3]])) == [True, False]
+
+
+def test_transforms_and_booleans():
+    obj = q(10) - q(2).x(4).y(4)
+    assert list(contains(obj, [[1, 1, 1], [5, 5, 1], [5, 5, 5]])) == [True, False, True]
+    assert distance(b(2).x(5), [8, 0, 0]) == pytest.approx(2)
+    assert distance(b(2).s(2, 2, 2), [5, 0, 0]) == pytest.approx(3)
+    assert distance(cy(d=2, h=10).rx(90), [0, -5, 3]) == pytest.approx(2)
+
+
+def test_holes_below_extrusions_are_extruded():
+    obj = (s(10) + c(d=3).t(5, 5, 0).h()).e(2)
+    assert "Holes" in solid.scad_render(obj)
+    assert list(contains(obj, [[5, 5, 1], [1, 1, 1], [5, 5, 3]])) == [False, True, False]
+
+
+def test_holes_stop_at_part_roots():
+    part = solid.part()(q(4) + cy(d=1, h=9).t(2, 2, -1).h())
+    obj = part + q(4).x(10)
+    assert list(contains(obj, [[2, 2, 2], [1, 1, 1], [12, 2, 2]])) == [False, True, True]
+
+
+def test_module_calls_evaluate_their_body():
+    module = Module(q(4) - cy(d=2, h=9).t(2, 2, -1).h())
+    obj = module.x(10) + module.call().x(-10)
+    assert list(contains(obj, [[11, 1, 1], [12, 2, 2], [-9, 1, 1], [1, 1, 1]])) == [
+        True,
+        False,
+        True,
+        False,
+    ]
+
+
+def test_hull_of_translated_copies():
+    assert list(contains(q(2) ** q(2).x(6), [[4, 1, 1], [4, 3, 1]])) == [True, False]
+    chain = hull_chain(b(2), [[0, 0, 0], [10, 0, 0], [10, 10, 0]])
+    assert distance(chain, [[5, 0, 3], [5, 5, 0], [10, 5, 0]]) == pytest.approx([2, 4, -1])
+
+
+def test_sweep_is_covered_between_slices():
+    swept = sweep(c(d=2), [[0, 0, 0], [0, 0, 5], [3, 0, 10]], thickness=0.01)
+    assert list(contains(swept, [[0, 0, 2.5], [0.9, 0, 2.5], [1.2, 0, 2.5]])) == [True, True, False]
+
+
+def test_unsupported_raises():
+    with pytest.raises(NotImplementedError):
+        contains(q(1) ** b(1), [0, 0, 0])
+    with pytest.raises(NotImplementedError):
+        contains(solid.minkowski()(q(1), b(1)), [0, 0, 0])
+
+
+def test_offset():
+    assert list(s(4).o(r=1).contains([[4.5, 4.5, 0], [4.9, 4.9, 0]])) == [True, False]
+    assert list(c(4).o(r=-0.5).contains([[1.4, 0, 0], [1.6, 0, 0]])) == [True, False]
+    # delta keeps the corners sharp
+    assert list(s(4).o(delta=1).contains([[4.9, 4.9, 0], [5.1, 1, 0]])) == [True, False]
+    assert distance(s(4).x(3).rz(30).o(delta=1), [0, 0, 0]) == pytest.approx(2)
+    triangle = solid.offset(delta=1)(solid.polygon([[0, 0], [4, 0], [0, 4]]))
+    assert list(contains(triangle, [[-0.9, -0.9], [-1.1, 0], [2.6, 2.6]])) == [True, False, True]
+
+
+def test_offset_of_a_bound_raises():
+    notch = s(10) - s(10).x(5).y(5)
+    with pytest.raises(NotImplementedError):
+        notch.o(r=4).contains([12, 12, 0])
+    with pytest.raises(NotImplementedError):
+        (s(2) + s(2).x(1)).o(delta=1).contains([0, 0, 0])
+
+
+def test_extrude_with_unit_scale_list():
+    assert list(solid.linear_extrude(2, scale=[1, 1])(s(2)).contains([[1, 1, 1], [1, 1, 3]])) == [True, False]
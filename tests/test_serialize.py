@@ -0,0 +1,123 @@
+import pickle
+
+import pytest
+import solid
+from solidff import q, cy, b, save, load
+from solidff import serialize
+
+
+def sample():
+    shared = cy(1, 5).x(2)
+    root = solid.union()(
+        q(1, 2, 3).x(1.5),
+        shared,
+        shared.y(3),
+        solid.part()(q(4) - cy(1, 9).hole()),
+        solid.multmatrix(m=[[1, 0, 0, 1], [0, 1, 0, 2], [0, 0, 1, 3], [0, 0, 0, 1]])(b(2)),
+        solid.multmatrix(m=[[1, 0, 0, 1], [0, 1, 0, 2], [0, 0, 1, 3], [0, 0, 0, 1]])(b(3)),
+        solid.color("red", alpha=0.5)(q(1)),
+        solid.translate((-0.0, float("inf"), 2**70))(q(1)),
+    )
+    root.children[-1].set_modifier("#")
+    return root
+
+
+def test_round_trip_renders_the_same(tmp_path):
+    root = sample()
+    fn = tmp_path / "t.sff"
+    save(root, fn)
+    loaded = load(fn)
+    assert solid.scad_render(loaded) == solid.scad_render(root)
+    assert type(loaded.children[0]) is type(root.children[0])
+
+
+def test_shared_subtrees_stay_shared():
+    loaded = serialize.loads(serialize.dumps(sample()))
+    assert loaded.children[1] is loaded.children[2].children[0]
+    assert loaded.children[0].parent is loaded
+
+
+def test_params_are_not_shared_between_nodes():
+    loaded = serialize.loads(serialize.dumps(sample()))
+    a, b_ = loaded.children[4], loaded.children[5]
+    assert a.params == b_.params
+    assert a.params is not b_.params
+    assert a.params["m"] is not b_.params["m"]
+    assert a.params["m"][0] is not b_.params["m"][0]
+    a.params["m"][0][3] = 7
+    assert b_.params["m"][0][3] == 1
+
+
+def test_value_types_survive():
+    root = solid.cube(size=[1, 2.0, True], center=(1, None))
+    root.params["big"] = 2**70
+    root.params["fraction"] = __import__("fractions").Fraction(1, 3)  # pickled
+    root.add_trait("anchor", {"x": [1, 2]})
+    root.custom = "extra attribute"
+    loaded = serialize.loads(serialize.dumps(root))
+    assert loaded.params == root.params
+    assert [type(v) for v in loaded.params["size"]] == [int, float, bool]
+    assert type(loaded.params["center"]) is tuple
+    assert loaded.traits == root.traits
+    assert loaded.custom == "extra attribute"
+
+
+def test_deep_trees():
+    node = q(1)
+    for _ in range(5000):
+        node = node.x(1)
+    loaded = serialize.loads(serialize.dumps(node))
+    depth = 0
+    while loaded.children:
+        loaded = loaded.children[0]
+        depth += 1
+    assert depth == 5000
+
+
+def test_sections_are_aligned():
+    assert serialize._HEADER.size % 8 == 0
+
+
+def test_smaller_than_pickle():
+    root = solid.union()(*[q(1 + i % 5, 2, 3).x(i % 17) for i in range(2000)])
+    assert len(serialize.dumps(root)) * 3 < len(pickle.dumps(root, protocol=5))
+
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError):
+        serialize.loads(b"not a solidff file, not at all, nope" * 10)
+
+
+def test_rejects_truncated_files(tmp_path):
+    data = serialize.dumps(sample())
+    for cut in (len(data) - 8, len(data) // 2, serialize._HEADER.size + 3):
+        with pytest.raises(ValueError):
+            serialize.loads(data[:cut])
+        fn = tmp_path / "t.sff"
+        fn.write_bytes(data[:cut])
+        with pytest.raises(ValueError):
+            load(fn)
+
+
+def test_load_passes_decoding_errors_on(tmp_path, monkeypatch):
+    fn = tmp_path / "t.sff"
+    save(sample(), fn)
+
+    def broken(qualified):
+        raise KeyError(qualified)
+
+    monkeypatch.setattr(serialize, "_resolve", broken)
+    with pytest.raises(KeyError):
+        load(fn)
+
+
+def test_imported_modules_round_trip(tmp_path):
+    lib = tmp_path / "lib.scad"
+    lib.write_text("module gear(teeth = 8) { cylinder(r = teeth); }\n")
+    gear = solid.import_scad(str(lib)).gear(teeth=12)
+    root = solid.union()(solid.translate([3, 0, 0])(gear), q(1))
+    fn = tmp_path / "t.sff"
+    save(root, fn)
+    loaded = load(fn)
+    assert solid.scad_render(loaded) == solid.scad_render(root)
+    assert f"use <{lib}>" in solid.scad_render(loaded)
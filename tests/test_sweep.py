@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+import solid
+from solidff import q, cy, c, b, hull_chain, sweep, Module, dump, scad_render_cached
+
+
+def _definitions_at_top_level(code):
+    """names of the ff_module definitions, checking they are all at file level"""
+    depth = 0
+    found = set()
+    for line in code.splitlines():
+        if line.lstrip().startswith("module "):
+            assert depth == 0, line
+            if "ff_module_" in line:
+                found.add(line.split()[1])
+        depth += line.count("{") - line.count("}")
+    return found
+
+
+PATH = np.array([[0, 0, 0], [10, 0, 0], [10, 10, 0], [10, 10, 10]])
+
+
+def test_hull_chain_defines_the_module_once_at_file_level():
+    code = solid.scad_render(hull_chain(b(2), PATH))
+    assert len(_definitions_at_top_level(code)) == 1
+    assert code.count("hull()") == 3
+    assert code.count("sphere(") == 1
+    assert scad_render_cached(hull_chain(b(2), PATH)) == code
+
+
+def test_module_inside_split_fragments(tmp_path):
+    chains = solid.union()(*[hull_chain(b(i + 1), PATH).x(i * 20) for i in range(3)])
+    fn = tmp_path / "t.scad"
+    dump(chains, str(fn), split=True, min_nodes=5)
+    names = set()
+    for f in [fn, *(tmp_path / "t_fragments").glob("*.scad")]:
+        names |= _definitions_at_top_level(f.read_text())
+    assert len(names) == 3
+
+
+def test_module_body_includes(tmp_path):
+    lib = tmp_path / "lib.scad"
+    lib.write_text("module gear() { cube(1); }\n")
+    gear = solid.import_scad(str(lib)).gear()
+    code = solid.scad_render(hull_chain(gear, PATH))
+    assert f"use <{lib}>" in code
+
+
+def test_module_body_holes_are_subtracted_inside():
+    body = q(4) - cy(1, 9).h()
+    solid.union()(body)  # gives body a parent, it's still rendered as a root
+    code = solid.scad_render(Module(body))
+    definition = code[code.index("module ") :]
+    assert "/* Holes Below*/" in definition
+
+
+def test_sweep_turns_the_profile_along_the_path():
+    path = np.array([[0, 0, 0], [5, 0, 0], [10, 0, 0]])
+    swept = sweep(c(2), path)
+    hull = swept.children[0]
+    m = np.array(hull.children[0].params["m"])
+    # the profile's normal (z) points along the path (x)
+    assert np.allclose(m[:3, :3] @ [0, 0, 1], [1, 0, 0])
+    assert np.allclose(m[:3, 3], [0, 0, 0])
+
+
+def test_path_is_checked():
+    with pytest.raises(ValueError):
+        hull_chain(b(1), [[0, 0, 0]])
+    with pytest.raises(ValueError):
+        hull_chain(b(1), [[0, 0], [1, 1]])
+
+
+def test_paths_with_repeated_points_are_rejected():
+    with pytest.raises(ValueError, match="repeated"):
+        sweep(c(2), [[0, 0, 0], [0, 0, 5], [0, 0, 5], [3, 0, 10]])
+    with pytest.raises(ValueError, match="repeated"):
+        hull_chain(b(2), [[0, 0, 0], [0, 0, 0], [3, 0, 10]])
+    with pytest.raises(ValueError, match="back"):
+        sweep(c(2), [[0, 0, 0], [0, 0, 5], [0, 0, 0]])
+    with pytest.raises(ValueError):
+        sweep(c(2), [[0, 0, 0], [0, 0, np.nan]])
+    assert "nan" not in solid.scad_render(sweep(c(2), PATH))